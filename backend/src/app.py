@@ -1,17 +1,48 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from src.config import settings
 from src.router import all_routers
+from src.services.staging import sweep_staged_uploads
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Clean up upload stages orphaned by a previous run."""
+    sweep_staged_uploads()
+    yield
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="FinSight API",
     description="AI-powered financial insights and analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Configure CORS
+# Room for multipart boundaries and part headers on top of the file itself
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject uploads whose declared Content-Length is over the limit, before the body is read."""
+    if request.url.path.startswith("/upload"):
+        length = request.headers.get("content-length", "")
+        max_bytes = settings.max_upload_size_mb * 1024 * 1024 + UPLOAD_FORM_OVERHEAD_BYTES
+        if length.isdigit() and int(length) > max_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File exceeds the {settings.max_upload_size_mb} MB upload limit"}
+            )
+    return await call_next(request)
+
+
+# Configure CORS; added last so it wraps every response, including 413s
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
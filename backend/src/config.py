@@ -21,9 +21,46 @@ class Settings(BaseSettings):
     
     gemini_api_key: str
     gemini_model: str
+    insights_cache_ttl_hours: int = 24
+    llm_backend: str = "gemini"
+    llm_offline_latency_ms: int = 200
+    llm_offline_error_rate: float = 0.0
+    llm_offline_seed: int = 0
+    llm_max_concurrency: int = 8
+    llm_requests_per_minute: int = 60
+    llm_burst: int = 10
+    llm_timeout_seconds: float = 30.0
+    llm_max_retries: int = 2
+    llm_retry_base_seconds: float = 0.5
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_seconds: float = 30.0
+    categorization_batch_token_budget: int = 4000
+    categorization_batch_max_items: int = 100
+    category_cache_max_entries: int = 10000
+    category_cache_ttl_days: int = 30
+    category_model_confidence_threshold: float = 0.7
+    category_model_min_samples: int = 20
+    category_model_training_rows: int = 5000
+    category_model_cache_mb: int = 256
     
     cors_origins: str 
     max_upload_size_mb: int
+    upload_insert_batch_size: int = 500
+    upload_parse_chunk_rows: int = 5000
+    import_jobs_per_user: int = 2
+    import_max_queued_jobs_per_user: int = 10
+    import_job_retention_minutes: int = 60
+    upload_stage_ttl_minutes: int = 30
+    upload_stage_dir: str = ""
+    upload_preview_rows: int = 20
+    analytics_use_rpc: bool = True
+    analytics_use_rollups: bool = True
+    transactions_page_size: int = 100
+    transactions_max_page_size: int = 500
+    anomaly_window_days: int = 90
+    anomaly_method: str = "zscore"
+    anomaly_zscore_threshold: float = 2.0
+    anomaly_mad_threshold: float = 3.5
 
     @property
     def cors_origins_list(self) -> List[str]:
@@ -1,7 +1,10 @@
 from src.database.connection import get_supabase, get_supabase_admin
 from src.database.models import *
+from src.database.paging import POSTGREST_MAX_ROWS, keyset_filter
 
 __all__ = [
     'get_supabase',
     'get_supabase_admin',
+    'POSTGREST_MAX_ROWS',
+    'keyset_filter',
 ]
@@ -0,0 +1,33 @@
+from typing import Sequence, Tuple
+
+# PostgREST returns at most this many rows per request by default, so paged
+# scans must not ask for more or a capped page would look like the last one
+POSTGREST_MAX_ROWS = 1000
+
+
+def _quote(value) -> str:
+    """Quote a filter value so commas and parentheses in it are not parsed."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def keyset_filter(after: Sequence[Tuple[str, object]], op: str = "gt") -> str:
+    """
+    Build an `or_` filter for the rows strictly past a position in a sort order.
+    
+    For keys (a, b) this is `a > x OR (a = x AND b > y)`, which Postgres
+    answers with an index range scan however deep the position is.
+    
+    Args:
+        after: (column, value) pairs of the last row seen, in sort order
+        op: 'gt' when sorting ascending, 'lt' when sorting descending
+    
+    Returns:
+        Filter string for the query's or_ method
+    """
+    terms = []
+    for i, (column, value) in enumerate(after):
+        conditions = [f"{key}.eq.{_quote(seen)}" for key, seen in after[:i]]
+        conditions.append(f"{column}.{op}.{_quote(value)}")
+        terms.append(conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})")
+    return ",".join(terms)
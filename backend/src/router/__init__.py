@@ -3,6 +3,7 @@ from src.router.transactions import router as transactions_router
 from src.router.analytics import router as analytics_router
 from src.router.insights import router as insights_router
 from src.router.upload import router as upload_router
+from src.router.categories import router as categories_router
 
 # Collect all routers
 all_routers = [
@@ -11,4 +12,5 @@ all_routers = [
     analytics_router,
     insights_router,
     upload_router,
+    categories_router,
 ]
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends
-from typing import Optional
+from typing import Literal, Optional
 from datetime import date
 
 from src.utils.auth import get_current_user_id
-from src.services.analytics import get_spending_summary, detect_anomalies, compare_monthly_trends
+from src.services.analytics import get_spending_summary, get_merchant_spending, detect_anomalies, compare_monthly_trends
+from src.services.rollups import rebuild_rollups
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -18,12 +19,26 @@ async def get_summary(
     return await get_spending_summary(user_id, start_date, end_date)
 
 
+@router.get("/merchants")
+async def get_merchants(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = 20,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get spending by merchant."""
+    return await get_merchant_spending(user_id, start_date, end_date, limit)
+
+
 @router.get("/anomalies")
 async def get_anomalies(
+    window_days: Optional[int] = None,
+    threshold: Optional[float] = None,
+    method: Optional[Literal["zscore", "mad"]] = None,
     user_id: str = Depends(get_current_user_id)
 ):
     """Detect spending anomalies."""
-    return await detect_anomalies(user_id)
+    return await detect_anomalies(user_id, window_days=window_days, threshold=threshold, method=method)
 
 
 @router.get("/trends")
@@ -33,3 +48,11 @@ async def get_trends(
 ):
     """Compare monthly spending trends."""
     return await compare_monthly_trends(user_id, months)
+
+
+@router.post("/rollups/rebuild")
+async def rebuild_monthly_rollups(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Recompute monthly rollups from transactions."""
+    return rebuild_rollups(user_id)
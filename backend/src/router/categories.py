@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from src.utils.auth import get_current_user_id
+from src.services.category_rules import list_rules, create_rule, delete_rule, get_rule_stats
+from src.utils.prompt import CATEGORIES
+from src.utils.schema import CategoryRuleCreate
+
+router = APIRouter(prefix="/categories", tags=["Categories"])
+
+
+@router.get("/rules")
+async def get_rules(
+    user_id: str = Depends(get_current_user_id)
+):
+    """List keyword categorization rules."""
+    return await list_rules(user_id)
+
+
+@router.post("/rules", status_code=status.HTTP_201_CREATED)
+async def add_rule(
+    rule: CategoryRuleCreate,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Add a keyword categorization rule."""
+    if rule.category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Unknown category: {rule.category}")
+    return await create_rule(user_id, rule.keyword, rule.category)
+
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_rule(
+    rule_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Delete a keyword categorization rule."""
+    deleted = await delete_rule(user_id, rule_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Rule not found")
+
+
+@router.get("/rules/stats")
+async def get_rules_stats(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get the share of transactions categorized locally by keyword rules."""
+    return get_rule_stats()
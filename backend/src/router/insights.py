@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from src.utils.auth import get_current_user_id
-from src.services.insights import generate_insights, get_user_insights
+from src.services.insights import generate_insights, stream_insights, get_user_insights
 from src.utils.schema import InsightGenerate
 
 router = APIRouter(prefix="/insights", tags=["Insights"])
@@ -13,7 +15,23 @@ async def create_insights(
     user_id: str = Depends(get_current_user_id)
 ):
     """Generate AI-powered insights."""
-    return await generate_insights(user_id, params.period)
+    return await generate_insights(user_id, params.period, params.force_refresh)
+
+
+@router.post("/generate/stream")
+async def create_insights_stream(
+    params: InsightGenerate,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Generate AI-powered insights, streamed as server-sent events."""
+    events = stream_insights(user_id, params.period, params.force_refresh)
+    # Starlette leaves the generator suspended when the client disconnects; close it so the LLM stream stops
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(events.aclose)
+    )
 
 
 @router.get("")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Optional
+from typing import Literal, Optional
 from datetime import date
 
 from src.utils.auth import get_current_user_id
@@ -8,9 +8,12 @@ from src.services.transactions import (
     get_transactions, 
     get_transaction_by_id,
     update_transaction, 
-    delete_transaction
+    delete_transaction,
+    InvalidCursor
 )
 from src.services.categorization import categorize_transactions_batch, suggest_category
+from src.services.category_cache import get_cache_stats
+from src.services.category_model import get_model_stats
 from src.utils.schema import TransactionCreate, TransactionFilter
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
@@ -31,16 +34,23 @@ async def list_transactions(
     end_date: Optional[date] = None,
     category: Optional[str] = None,
     type: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Literal["date", "amount", "category"] = "date",
+    order: Literal["asc", "desc"] = "desc",
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get all transactions for the current user."""
+    """Get a page of transactions for the current user."""
     filters = TransactionFilter(
         start_date=start_date,
         end_date=end_date,
         category=category,
         type=type
     )
-    return await get_transactions(user_id, filters)
+    try:
+        return await get_transactions(user_id, filters, limit, cursor, sort, order == "desc")
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{transaction_id}")
@@ -88,6 +98,22 @@ async def categorize_all_transactions(
     return result
 
 
+@router.get("/categorize/cache-stats")
+async def get_categorization_cache_stats(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get category cache hit/miss counters."""
+    return get_cache_stats()
+
+
+@router.get("/categorize/model-stats")
+async def get_categorization_model_stats(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get local categorization model counters."""
+    return get_model_stats()
+
+
 @router.post("/suggest-category")
 async def get_category_suggestion(
     description: str,
@@ -95,4 +121,4 @@ async def get_category_suggestion(
     user_id: str = Depends(get_current_user_id)
 ):
     """Get category suggestion for a transaction."""
-    return await suggest_category(description, amount)
+    return await suggest_category(description, amount, user_id)
@@ -1,12 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import os
+from io import BytesIO
+from typing import BinaryIO, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
 from fastapi.responses import Response
 
+from src.config import settings
 from src.utils.auth import get_current_user_id
 from src.services.upload import parse_csv_file, get_csv_template
-from src.utils.schema import CSVUploadResponse
+from src.services.import_jobs import submit_import_job, get_import_job, list_import_jobs, cancel_import_job
+from src.services.staging import stage_upload, get_staged_upload, commit_staged_upload, discard_staged_upload
+from src.utils.schema import CSVUploadResponse, ImportJobStatus, UploadPreview
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
+def _upload_file(file: UploadFile, detach: bool = False) -> BinaryIO:
+    """
+    Return the upload's spooled file, enforcing the size limit.
+    
+    Starlette has already written the multipart body to a temporary file by
+    the time a handler runs, so that file is used as is rather than copied.
+    Requests declaring a Content-Length over the limit are turned away by
+    the app middleware before the body is received; this check catches the
+    rest (e.g. chunked requests) after receipt.
+    
+    Args:
+        file: The uploaded file
+        detach: Take ownership of the file so it outlives the request;
+            the caller must close it
+    
+    Raises:
+        HTTPException: 413 if the file exceeds the configured size limit
+    """
+    size = file.size if file.size is not None else file.file.seek(0, os.SEEK_END)
+    if size > settings.max_upload_size_mb * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the {settings.max_upload_size_mb} MB upload limit"
+        )
+    
+    spooled = file.file
+    spooled.seek(0)
+    if detach:
+        # FastAPI closes the form's files once the response is sent
+        file.file = BytesIO()
+    return spooled
+
+
+def _file_extension(file: UploadFile) -> str:
+    """Return the upload's extension, rejecting anything but CSV and Excel."""
+    if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx')):
+        raise HTTPException(status_code=400, detail="Only CSV and Excel (.xlsx) files are allowed")
+    
+    return '.xlsx' if file.filename.endswith('.xlsx') else '.csv'
+
 
 @router.post("/csv", response_model=CSVUploadResponse)
 async def upload_csv(
@@ -15,26 +62,107 @@ async def upload_csv(
 ):
     """Upload and parse CSV or Excel file with transactions."""
     # Validate file type
-    if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx')):
-        raise HTTPException(status_code=400, detail="Only CSV and Excel (.xlsx) files are allowed")
-    
-    # Get file extension
-    file_extension = '.xlsx' if file.filename.endswith('.xlsx') else '.csv'
-    
-    # Read file content
-    content = await file.read()
-    
-    # Decode for CSV, keep bytes for Excel
-    if file_extension == '.csv':
-        file_content = content.decode('utf-8')
-    else:
-        file_content = content
+    file_extension = _file_extension(file)
     
     # Parse and import
-    result = await parse_csv_file(file_content, user_id, file_extension)
+    return await parse_csv_file(_upload_file(file), user_id, file_extension)
+
+
+@router.post("/preview", response_model=UploadPreview)
+async def preview_upload(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Parse and validate a file, staging its rows for a later commit."""
+    file_extension = _file_extension(file)
+    return await stage_upload(user_id, _upload_file(file), file.filename, file_extension)
+
+
+@router.get("/preview/{stage_id}", response_model=UploadPreview)
+async def get_upload_preview(
+    stage_id: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get a page of a staged upload."""
+    preview = await get_staged_upload(user_id, stage_id, offset, limit)
+    if not preview:
+        raise HTTPException(status_code=404, detail="Staged upload not found or expired")
+    return preview
+
+
+@router.post("/preview/{stage_id}/commit", response_model=CSVUploadResponse)
+async def commit_upload_preview(
+    stage_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Import a staged upload."""
+    result = await commit_staged_upload(user_id, stage_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Staged upload not found or expired")
     return result
 
 
+@router.delete("/preview/{stage_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def discard_upload_preview(
+    stage_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Discard a staged upload."""
+    discarded = await discard_staged_upload(user_id, stage_id)
+    if not discarded:
+        raise HTTPException(status_code=404, detail="Staged upload not found or expired")
+
+
+@router.post("/jobs", response_model=ImportJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def create_import_job(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Upload a CSV or Excel file and import it in the background."""
+    file_extension = _file_extension(file)
+    upload = _upload_file(file, detach=True)
+    
+    job = await submit_import_job(user_id, upload, file.filename, file_extension)
+    if not job:
+        upload.close()
+        raise HTTPException(status_code=429, detail="Too many import jobs in progress")
+    return job
+
+
+@router.get("/jobs", response_model=List[ImportJobStatus])
+async def get_import_jobs(
+    user_id: str = Depends(get_current_user_id)
+):
+    """List recent import jobs."""
+    return await list_import_jobs(user_id)
+
+
+@router.get("/jobs/{job_id}", response_model=ImportJobStatus)
+async def get_import_job_status(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get progress and result of an import job."""
+    job = await get_import_job(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.delete("/jobs/{job_id}", response_model=ImportJobStatus)
+async def cancel_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Cancel a queued or running import job."""
+    job = await cancel_import_job(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
 @router.get("/template")
 async def download_template():
     """Download Excel template."""
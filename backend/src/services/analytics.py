@@ -1,53 +1,282 @@
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
 import numpy as np
 
+from src.config import settings
 from src.database import get_supabase_admin
+from src.services.rollups import get_rollups, month_start, rollups_ready
+from src.services.transactions import iter_transaction_pages
+from src.utils.logging import *
+from src.utils.merchant import canonicalize_merchant
+from src.utils.transaction_frame import EXPENSE, INCOME, TransactionFrame, month_number
 
+# Columns needed by the summary, anomaly and trend analytics
+SNAPSHOT_COLUMNS = "id, date, description, amount, category, type"
 
-async def get_spending_summary(
+# Narrower projection for aggregates that never report single rows
+AGGREGATE_COLUMNS = "id, date, amount, category, type"
+
+# Postgres function computing totals, category breakdown and date bounds
+SUMMARY_RPC = "spending_summary"
+
+# After the RPC fails (e.g. not migrated yet) the Python path is used this long
+RPC_RETRY = timedelta(minutes=10)
+
+_rpc_retry_at: Optional[datetime] = None
+
+# Anomaly scoring methods: mean/standard deviation, or median/MAD
+ANOMALY_METHODS = ("zscore", "mad")
+
+# Scales the MAD to a standard deviation for normally distributed amounts
+MAD_SCALE = 1.4826
+
+# Scales the mean absolute deviation to a standard deviation, used instead
+# of the MAD when more than half of a category's amounts are identical
+MEAN_AD_SCALE = 1.2533
+
+# Categories with fewer expenses than this are never scored
+ANOMALY_MIN_CATEGORY_SIZE = 5
+
+# Most anomalies returned, highest score first
+ANOMALY_LIMIT = 10
+
+
+def _fetch_transactions(
     user_id: str,
+    columns: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
+) -> List[Dict]:
+    """Fetch all of a user's transactions in a date window, page by page."""
+    return [row for page in iter_transaction_pages(user_id, columns, start_date, end_date) for row in page]
+
+
+def _fetch_rows_by_id(user_id: str, ids: List[str]) -> Dict[str, Dict]:
+    """Fetch complete transaction rows for a few ids, keyed by id."""
+    if not ids:
+        return {}
+    
+    supabase = get_supabase_admin()
+    try:
+        result = supabase.table("transactions").select("*").eq("user_id", user_id).in_("id", ids).execute()
+    except Exception as e:
+        log_error("Error fetching anomalous transactions", error=e, context={"user_id": user_id, "count": len(ids)})
+        return {}
+    return {str(row["id"]): row for row in result.data}
+
+
+def load_transaction_snapshot(user_id: str, start_date: Optional[date] = None) -> TransactionFrame:
+    """
+    Fetch the rows shared by several analytics in one request.
+    
+    The result can be passed as `frame` to get_spending_summary,
+    detect_anomalies and compare_monthly_trends, so they slice it in memory
+    instead of each querying the database.
+    
+    Args:
+        user_id: User ID
+        start_date: Oldest date needed; all history if omitted
+    
+    Returns:
+        Columnar frame of SNAPSHOT_COLUMNS
+    """
+    return TransactionFrame.from_rows(_fetch_transactions(user_id, SNAPSHOT_COLUMNS, start_date))
+
+
+def analysis_window_start(months: int = 3) -> date:
+    """
+    Oldest date read by detect_anomalies (default window) and
+    compare_monthly_trends for `months`, so a snapshot from it serves both.
+    """
+    today = datetime.now().date()
+    anomaly_start = (datetime.now() - timedelta(days=max(1, settings.anomaly_window_days))).date()
+    return min(anomaly_start, _add_months(today, 1 - max(months, 1)))
+
+
+async def get_spending_summary(
+    user_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    frame: Optional[TransactionFrame] = None
 ) -> Dict:
     """
     Get spending summary for a user within a date range.
     
+    Without a snapshot the aggregation runs in Postgres (SUMMARY_RPC), and
+    the rows are only summed here if that call is unavailable.
+    
     Args:
         user_id: User ID
         start_date: Start date for analysis
         end_date: End date for analysis
-        
+        frame: Optional snapshot from load_transaction_snapshot to use
+            instead of querying
+    
     Returns:
         Dictionary with spending summary
     """
-    supabase = get_supabase_admin()
+    if frame is not None:
+        return _build_summary(*_summarize_frame(frame.between(start_date, end_date)), start_date, end_date)
+    
+    aggregates = _summarize_with_rollups(user_id, start_date, end_date)
+    if aggregates is None:
+        aggregates = _summarize_range(user_id, start_date, end_date)
+    
+    return _build_summary(*aggregates, start_date, end_date)
+
+
+def _summarize_frame(frame: TransactionFrame) -> Tuple[float, float, Dict, Optional[date], Optional[date]]:
+    """Aggregate a frame into (income, expense, categories, first date, last date)."""
+    expenses = frame.of_type(EXPENSE)
+    sums = expenses.category_sums()
+    counts = expenses.category_counts()
+    
+    category_totals = {
+        frame.categories[code]: {"total": float(sums[code]), "count": int(counts[code])}
+        for code in np.flatnonzero(counts)
+    }
     
-    # If no dates provided, get all transactions
-    # Otherwise use the specified date range
-    query = supabase.table("transactions").select("*").eq("user_id", user_id)
+    return frame.total(INCOME), frame.total(EXPENSE), category_totals, frame.first_date, frame.last_date
+
+
+def _summarize_range(
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Tuple[float, float, Dict, Optional[date], Optional[date]]:
+    """Aggregate raw transactions in a date range, in Postgres when the RPC is available."""
+    aggregates = _summarize_via_rpc(user_id, start_date, end_date)
+    if aggregates is None:
+        aggregates = _summarize_frame(TransactionFrame.from_rows(_fetch_transactions(user_id, AGGREGATE_COLUMNS, start_date, end_date)))
+    return aggregates
+
+
+def _summarize_with_rollups(
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Optional[Tuple[float, float, Dict, Optional[date], Optional[date]]]:
+    """
+    Aggregate whole months from the monthly rollups and only the partial
+    months at either edge of the range from raw transactions.
     
-    if start_date:
-        query = query.gte("date", start_date.isoformat())
-    if end_date:
-        query = query.lte("date", end_date.isoformat())
+    Returns:
+        Same tuple as _summarize_frame, or None if the user's rollups are not
+        ready or the range contains no whole month
+    """
+    # First and last day of the whole months inside the range
+    first_full = start_date if start_date is None or start_date.day == 1 else _next_month(start_date)
+    last_full = end_date if end_date is None or _next_month(end_date) - timedelta(days=1) == end_date else month_start(end_date) - timedelta(days=1)
+    if first_full and last_full and first_full > last_full:
+        return None
+    if not rollups_ready(user_id):
+        return None
+    
+    rollups = _rollup_frame(get_rollups(user_id, first_full, month_start(last_full) if last_full else None))
+    total_income, total_expense, whole_months, _, _ = _summarize_frame(rollups)
+    category_totals = defaultdict(lambda: {"total": 0.0, "count": 0}, whole_months)
+    has_rows = len(rollups) > 0
+    
+    edges = []
+    if start_date and start_date < first_full:
+        edges.append((start_date, first_full - timedelta(days=1)))
+    if end_date and last_full < end_date:
+        edges.append((last_full + timedelta(days=1), end_date))
+    
+    for edge_start, edge_end in edges:
+        income, expense, edge_categories, edge_first, _ = _summarize_range(user_id, edge_start, edge_end)
+        total_income += income
+        total_expense += expense
+        for category, data in edge_categories.items():
+            category_totals[category]["total"] += data["total"]
+            category_totals[category]["count"] += data["count"]
+        has_rows = has_rows or edge_first is not None
+    
+    # Rollups only know months, so open-ended ranges look up the real bounds
+    actual_start = actual_end = None
+    if has_rows:
+        actual_start = start_date or _edge_date(user_id, desc=False)
+        actual_end = end_date or _edge_date(user_id, desc=True)
+    
+    return total_income, total_expense, category_totals, actual_start, actual_end
+
+
+def _rollup_frame(rows: List[Dict]) -> TransactionFrame:
+    """Frame of rollup rows, each standing for `count` transactions in its month."""
+    return TransactionFrame.from_rows(rows, date_key="month", amount_key="total", count_key="count")
+
+
+def _next_month(value: date) -> date:
+    """First day of the month after the one containing `value`."""
+    return _add_months(value, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    """First day of the month `months` after (or before) the one containing `value`."""
+    index = month_number(value) + months
+    return date(1970 + index // 12, index % 12 + 1, 1)
+
+
+def _edge_date(user_id: str, desc: bool) -> Optional[date]:
+    """The user's first (or last) transaction date, read from the index."""
+    supabase = get_supabase_admin()
+    result = supabase.table("transactions").select("date").eq("user_id", user_id).order("date", desc=desc).limit(1).execute()
+    return date.fromisoformat(str(result.data[0]["date"])[:10]) if result.data else None
+
+
+def _summarize_via_rpc(
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Optional[Tuple[float, float, Dict, Optional[date], Optional[date]]]:
+    """
+    Aggregate a user's transactions in Postgres with the SUMMARY_RPC function.
     
-    result = query.execute()
-    transactions = result.data
+    Only the totals, one row per expense category and the first/last dates
+    cross the network, however long the history is.
     
-    # Calculate totals
-    total_income = sum(t["amount"] for t in transactions if t["type"] == "income")
-    total_expense = sum(t["amount"] for t in transactions if t["type"] == "expense")
+    Returns:
+        (total_income, total_expense, category_totals, first_date, last_date),
+        or None if the RPC is disabled or failed
+    """
+    global _rpc_retry_at
+    if not settings.analytics_use_rpc or (_rpc_retry_at and _rpc_retry_at > datetime.now()):
+        return None
     
-    # Group by category
-    category_totals = defaultdict(lambda: {"total": 0.0, "count": 0})
+    supabase = get_supabase_admin()
+    try:
+        result = supabase.rpc(SUMMARY_RPC, {
+            "p_user_id": user_id,
+            "p_start": start_date.isoformat() if start_date else None,
+            "p_end": end_date.isoformat() if end_date else None
+        }).execute()
+    except Exception as e:
+        log_warning("Summary RPC failed, aggregating in Python", {"error": str(e)})
+        _rpc_retry_at = datetime.now() + RPC_RETRY
+        return None
     
-    for t in transactions:
-        if t["type"] == "expense":
-            category_totals[t["category"]]["total"] += t["amount"]
-            category_totals[t["category"]]["count"] += 1
+    data = result.data
+    category_totals = {
+        row["category"]: {"total": float(row["total"]), "count": int(row["count"])}
+        for row in data["categories"]
+    }
+    first_date = date.fromisoformat(data["first_date"]) if data["first_date"] else None
+    last_date = date.fromisoformat(data["last_date"]) if data["last_date"] else None
     
+    return float(data["total_income"]), float(data["total_expense"]), category_totals, first_date, last_date
+
+
+def _build_summary(
+    total_income: float,
+    total_expense: float,
+    category_totals: Dict,
+    actual_start: Optional[date],
+    actual_end: Optional[date],
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Dict:
+    """Shape aggregated totals into the spending summary response."""
     # Calculate percentages
     categories = []
     for category, data in category_totals.items():
@@ -63,11 +292,7 @@ async def get_spending_summary(
     categories.sort(key=lambda x: x["total"], reverse=True)
     
     # Determine period for response
-    if transactions:
-        # Get actual date range from transactions
-        dates = [datetime.fromisoformat(t["date"].replace('Z', '+00:00')).date() if isinstance(t["date"], str) else t["date"] for t in transactions]
-        actual_start = min(dates)
-        actual_end = max(dates)
+    if actual_start:
         period_start = start_date.isoformat() if start_date else actual_start.isoformat()
         period_end = end_date.isoformat() if end_date else actual_end.isoformat()
     else:
@@ -87,119 +312,245 @@ async def get_spending_summary(
     }
 
 
-async def detect_anomalies(user_id: str) -> List[Dict]:
+async def get_merchant_spending(
+    user_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = 20
+) -> Dict:
+    """
+    Get expense totals per merchant within a date range.
+    
+    Args:
+        user_id: User ID
+        start_date: Start date for analysis
+        end_date: End date for analysis
+        limit: Maximum number of merchants to return
+    
+    Returns:
+        Dictionary with the top merchants by total spend
+    """
+    merchant_totals = defaultdict(lambda: {"total": 0.0, "count": 0, "categories": defaultdict(int), "last_date": ""})
+    
+    # Streamed page by page, so only the running totals stay in memory
+    for page in iter_transaction_pages(user_id, "id, date, description, merchant, amount, category", start_date, end_date, "expense"):
+        for t in page:
+            # Rows imported before merchants were stored are canonicalized on the fly
+            merchant = t.get("merchant") or canonicalize_merchant(t["description"]) or t["description"]
+            data = merchant_totals[merchant]
+            data["total"] += t["amount"]
+            data["count"] += 1
+            data["categories"][t["category"]] += 1
+            data["last_date"] = max(data["last_date"], str(t["date"]))
+    
+    total_expense = sum(data["total"] for data in merchant_totals.values())
+    
+    merchants = []
+    for merchant, data in merchant_totals.items():
+        merchants.append({
+            "merchant": merchant,
+            "total": round(data["total"], 2),
+            "count": data["count"],
+            "average": round(data["total"] / data["count"], 2),
+            "percentage": round(data["total"] / total_expense * 100, 2) if total_expense > 0 else 0,
+            "category": max(data["categories"], key=data["categories"].get),
+            "last_date": data["last_date"]
+        })
+    
+    # Sort by total
+    merchants.sort(key=lambda x: x["total"], reverse=True)
+    
+    return {
+        "total_expense": round(total_expense, 2),
+        "merchant_count": len(merchants),
+        "merchants": merchants[:limit]
+    }
+
+
+def _category_groups(codes: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sort rows by category code, then value, so each category is one run.
+    
+    Returns:
+        The sort order, the start of each run in sorted order and its length
+    """
+    order = np.lexsort((values, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(codes)])
+    return order, starts, sizes
+
+
+def _run_medians(sorted_values: np.ndarray, starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Median of each run of an array sorted within runs."""
+    return (sorted_values[starts + (sizes - 1) // 2] + sorted_values[starts + sizes // 2]) / 2
+
+
+async def detect_anomalies(
+    user_id: str,
+    frame: Optional[TransactionFrame] = None,
+    window_days: Optional[int] = None,
+    threshold: Optional[float] = None,
+    method: Optional[str] = None
+) -> List[Dict]:
     """
     Detect unusual spending patterns using statistical methods.
     
+    Expenses are sorted once by category code and amount, so every category
+    is a contiguous run and its statistics are segment reductions over the
+    whole window. `zscore` scores each expense against its category's mean
+    and standard deviation. `mad` uses the median and the median absolute
+    deviation instead (the modified z-score), so a few extreme amounts do
+    not inflate the spread and hide each other. A category where most
+    amounts are identical (e.g. a fixed subscription) has a MAD of zero, so
+    its spread falls back to the mean absolute deviation around the median.
+    
     Args:
         user_id: User ID
-        
+        frame: Optional snapshot from load_transaction_snapshot to use
+            instead of querying
+        window_days: Days of history to analyze (default ANOMALY_WINDOW_DAYS)
+        threshold: Score above which an expense is flagged; defaults to
+            ANOMALY_ZSCORE_THRESHOLD or ANOMALY_MAD_THRESHOLD
+        method: 'zscore' or 'mad' (default ANOMALY_METHOD)
+    
     Returns:
         List of anomalous transactions
-    """
-    supabase = get_supabase_admin()
     
-    # Get last 90 days of transactions
-    start_date = (datetime.now() - timedelta(days=90)).date()
+    Raises:
+        ValueError: If the method is unknown
+    """
+    method = method or settings.anomaly_method
+    if method not in ANOMALY_METHODS:
+        raise ValueError(f"Unknown anomaly method: {method}")
+    if threshold is None:
+        threshold = settings.anomaly_zscore_threshold if method == "zscore" else settings.anomaly_mad_threshold
     
-    query = supabase.table("transactions").select("*").eq("user_id", user_id)
-    query = query.gte("date", start_date.isoformat()).eq("type", "expense")
+    window_days = max(1, window_days or settings.anomaly_window_days)
+    start_date = (datetime.now() - timedelta(days=window_days)).date()
     
-    result = query.execute()
-    transactions = result.data
+    if frame is None:
+        frame = TransactionFrame.from_rows(_fetch_transactions(user_id, SNAPSHOT_COLUMNS, start_date))
+    expenses = frame.between(start_date).of_type(EXPENSE)
     
-    if len(transactions) < 10:
+    if len(expenses) < 10:
         return []  # Not enough data for anomaly detection
     
-    # Group by category and find outliers using z-score
-    anomalies = []
-    category_groups = defaultdict(list)
+    order, starts, sizes = _category_groups(expenses.category_codes, expenses.amounts)
+    amounts = expenses.amounts[order]
+    groups = np.repeat(np.arange(len(starts)), sizes)
     
-    for t in transactions:
-        category_groups[t["category"]].append(t)
+    means = np.add.reduceat(amounts, starts) / sizes
+    deviations = amounts - means[groups]
     
-    for category, cat_transactions in category_groups.items():
-        if len(cat_transactions) < 5:
-            continue
-        
-        amounts = [t["amount"] for t in cat_transactions]
-        mean = np.mean(amounts)
-        std = np.std(amounts)
-        
-        if std == 0:
-            continue
-        
-        # Find transactions with z-score > 2 (outliers)
-        for t in cat_transactions:
-            z_score = (t["amount"] - mean) / std
-            if z_score > 2:
-                anomalies.append({
-                    "transaction": t,
-                    "z_score": round(z_score, 2),
-                    "category_average": round(mean, 2),
-                    "reason": f"Unusually high {category} expense"
-                })
+    if method == "zscore":
+        centers = means
+        spreads = np.sqrt(np.add.reduceat(deviations ** 2, starts) / sizes)
+    else:
+        # Amounts are sorted within each category, so medians are index lookups
+        centers = _run_medians(amounts, starts, sizes)
+        absolute = np.abs(amounts - centers[groups])
+        absolute = absolute[np.lexsort((absolute, groups))]
+        spreads = MAD_SCALE * _run_medians(absolute, starts, sizes)
+        mean_spreads = MEAN_AD_SCALE * np.add.reduceat(absolute, starts) / sizes
+        spreads = np.where(spreads > 0, spreads, mean_spreads)
     
-    # Sort by z-score
-    anomalies.sort(key=lambda x: x["z_score"], reverse=True)
+    # Categories need enough transactions and some spread
+    usable = (sizes >= ANOMALY_MIN_CATEGORY_SIZE) & (spreads > 0)
+    scores = np.zeros(len(amounts))
+    rows = usable[groups]
+    scores[rows] = (amounts[rows] - centers[groups][rows]) / spreads[groups][rows]
     
-    return anomalies[:10]  # Return top 10 anomalies
+    # Flag expenses above the threshold, highest score first
+    outliers = np.flatnonzero(scores > threshold)
+    outliers = outliers[np.lexsort((order[outliers], -scores[outliers]))][:ANOMALY_LIMIT]
+    
+    # The snapshot holds only the analysis columns; return the complete rows
+    flagged = [expenses.row(order[i]) for i in outliers]
+    full_rows = _fetch_rows_by_id(user_id, [str(row["id"]) for row in flagged if "id" in row])
+    
+    return [
+        {
+            "transaction": full_rows.get(str(row.get("id")), row),
+            "z_score": round(float(scores[i]), 2),
+            "category_average": round(float(centers[groups[i]]), 2),
+            "reason": f"Unusually high {expenses.categories[expenses.category_codes[order[i]]]} expense"
+        }
+        for i, row in zip(outliers, flagged)
+    ]
 
 
-async def compare_monthly_trends(user_id: str, months: int = 3) -> Dict:
+async def compare_monthly_trends(user_id: str, months: int = 3, frame: Optional[TransactionFrame] = None) -> Dict:
     """
     Compare spending trends across recent months.
     
+    The window is read from the monthly rollups when they are ready, or
+    fetched once from raw transactions, and bucketed by month with bincount,
+    so the number of queries does not grow with `months`.
+    
     Args:
         user_id: User ID
         months: Number of months to compare
-        
+        frame: Optional snapshot from load_transaction_snapshot to use
+            instead of querying
+    
     Returns:
         Dictionary with monthly comparison data
     """
-    supabase = get_supabase_admin()
+    # Window from the first day of the oldest month to the end of the current month
+    today = datetime.now().date()
+    months = max(months, 0)
+    window_start = _add_months(today, 1 - months)
+    window_end = _next_month(today) - timedelta(days=1)
+    
+    if not months:
+        window = TransactionFrame.from_rows([])
+    elif frame is not None:
+        window = frame.between(window_start, window_end)
+    elif rollups_ready(user_id):
+        # Every month in the window is whole, so rollups answer it entirely
+        window = _rollup_frame(get_rollups(user_id, window_start, month_start(today)))
+    else:
+        window = TransactionFrame.from_rows(_fetch_transactions(user_id, AGGREGATE_COLUMNS, window_start, window_end))
+    
+    # Row position of each month, most recent first, and one column per category
+    slots = (month_number(today) - window.months()).astype(np.int64)
+    n_categories = len(window.categories)
+    
+    income = np.bincount(slots[window.types == INCOME], weights=window.amounts[window.types == INCOME], minlength=months)
+    expense_rows = window.types == EXPENSE
+    expense = np.bincount(slots[expense_rows], weights=window.amounts[expense_rows], minlength=months)
+    
+    cells = slots[expense_rows] * n_categories + window.category_codes[expense_rows]
+    category_sums = np.bincount(cells, weights=window.amounts[expense_rows], minlength=months * n_categories).reshape(months, n_categories)
+    category_counts = np.bincount(cells, weights=window.row_counts()[expense_rows], minlength=months * n_categories).reshape(months, n_categories)
     
     monthly_data = []
     
-    for i in range(months):
-        # Calculate month boundaries - go back i months from current month
-        current_date = datetime.now()
-        # Calculate target month
-        target_month = current_date.month - i
-        target_year = current_date.year
-        
-        # Handle year rollover
-        while target_month <= 0:
-            target_month += 12
-            target_year -= 1
+    for slot in range(months):
+        total_income = float(income[slot])
+        total_expense = float(expense[slot])
         
-        # Get first day of target month
-        start_date = datetime(target_year, target_month, 1).date()
-        
-        # Get last day of target month
-        if target_month == 12:
-            end_date = datetime(target_year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            end_date = datetime(target_year, target_month + 1, 1).date() - timedelta(days=1)
-        
-        # Get month name
-        month_name = start_date.strftime("%B %Y")
-        
-        # Get spending summary for this month
-        summary = await get_spending_summary(
-            user_id,
-            start_date,
-            end_date
-        )
+        # Categories present this month, largest first; ties keep first appearance
+        present = np.flatnonzero(category_counts[slot])
+        ranked = present[np.argsort(-category_sums[slot][present], kind="stable")]
+        top_categories = [
+            {
+                "category": window.categories[code],
+                "total": round(float(category_sums[slot, code]), 2),
+                "count": int(category_counts[slot, code]),
+                "percentage": round(float(category_sums[slot, code]) / total_expense * 100, 2) if total_expense > 0 else 0
+            }
+            for code in ranked[:5]  # Top 5 categories
+        ]
         
         monthly_data.append({
-            "month": month_name,
-            "total_income": summary["total_income"],
-            "total_expense": summary["total_expense"],
-            "net": summary["net"],
-            "top_categories": summary["categories"][:5]  # Top 5 categories
+            "month": _add_months(today, -slot).strftime("%B %Y"),
+            "total_income": round(total_income, 2),
+            "total_expense": round(total_expense, 2),
+            "net": round(total_income - total_expense, 2),
+            "top_categories": top_categories
         })
-    
     # Calculate trends (compare most recent month to previous)
     trends = {}
     if len(monthly_data) >= 2:
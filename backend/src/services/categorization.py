@@ -1,105 +1,433 @@
-from typing import List, Dict
+import asyncio
+import json
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
 
+from src.config import settings
 from src.database import get_supabase_admin
+from src.services.category_cache import get_cached_categories, get_cached_category, cache_categories, cache_key
+from src.services.category_model import predict_categories, predict_category
+from src.services.category_rules import match_categories, match_category
+from src.services.transactions import iter_transaction_pages
 from src.utils.logging import *
-from src.utils.prompt import categorization_prompt, CATEGORIES
-from src.utils.llm.gemini_config import gemini_config
+from src.utils.prompt import categorization_prompt, batch_categorization_prompt, batch_categorization_item, CATEGORIES
+from src.utils.llm.gateway import LLMUnavailable, generate
 
+# Alternative categories returned alongside a suggestion
+SUGGESTION_ALTERNATIVES = 2
 
-async def categorize_transaction(description: str, amount: float) -> str:
+# PostgREST filters travel in the URL, so keep `in` lists short
+CATEGORY_UPDATE_BATCH_SIZE = 200
+
+
+async def _ask_llm(description: str, amount: float) -> Optional[str]:
+    """
+    Ask Gemini for the category of a single transaction.
+    
+    Returns:
+        A valid category name, or None if the call failed
+    """
+    try:
+        prompt = categorization_prompt(description, amount)
+        response = await generate(prompt)
+        category = response.text.strip()
+    except LLMUnavailable:
+        log_debug("LLM unavailable, skipping categorization", {"description": description[:50]})
+        return None
+    except Exception as e:
+        log_error("Error categorizing transaction", error=e, context={"description": description[:50], "amount": amount})
+        return None
+    
+    # Validate category
+    if category in CATEGORIES:
+        log_debug("Transaction categorized successfully", {"category": category})
+        return category
+    
+    log_warning("AI returned invalid category, defaulting to 'Other'", {"returned_category": category, "description": description[:50]})
+    return "Other"
+
+
+async def _resolve_category(
+    description: str,
+    amount: float,
+    user_id: Optional[str] = None,
+    ranked: Optional[List[Tuple[str, float]]] = None
+) -> Tuple[str, str]:
     """
-    Categorize a single transaction using Gemini AI.
+    Categorize a single transaction and report which stage decided it.
     
     Args:
         description: Transaction description
         amount: Transaction amount
-        
+        user_id: Optional user whose cached categories should be used
+        ranked: The local model's ranking for the description, if the caller
+            already has it; predicted here otherwise
+    
+    Returns:
+        Tuple of (category, source), where source is 'rule', 'cache',
+        'model', 'llm' or 'fallback'
+    """
+    # A rule the user added outranks whatever was cached before it existed
+    matched = await match_category(description, user_id, user_rules_only=True)
+    if matched:
+        return matched, "rule"
+    
+    cached = await get_cached_category(description, user_id)
+    if cached:
+        return cached, "cache"
+    
+    matched = await match_category(description, user_id)
+    if matched:
+        return matched, "rule"
+    
+    if ranked is None:
+        ranked = await predict_category(description, user_id, top_k=1)
+    if ranked and ranked[0][1] >= settings.category_model_confidence_threshold:
+        return ranked[0][0], "model"
+    
+    category = await _ask_llm(description, amount)
+    if category is None:
+        return "Other", "fallback"
+    
+    await cache_categories({description: category}, user_id)
+    return category, "llm"
+
+
+async def categorize_transaction(description: str, amount: float, user_id: Optional[str] = None) -> str:
+    """
+    Categorize a single transaction, trying the user's keyword rules, the
+    category cache, the built-in rules and the local model before Gemini AI.
+    
+    Args:
+        description: Transaction description
+        amount: Transaction amount
+        user_id: Optional user whose cached categories should be used
+    
     Returns:
         Category name
     """
+    log_debug("Categorizing transaction", {"description": description[:50], "amount": amount})
+    
+    category, _ = await _resolve_category(description, amount, user_id)
+    return category
+
+
+def _estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count of a prompt (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _pack_batches(item_lines: Dict[str, str]) -> List[List[str]]:
+    """
+    Group transaction ids into batches that fit the prompt token budget.
+    
+    Args:
+        item_lines: Mapping of transaction id to its prompt line
+    
+    Returns:
+        List of batches of transaction ids
+    """
+    budget = settings.categorization_batch_token_budget - _estimate_tokens(batch_categorization_prompt([]))
+    max_items = max(1, settings.categorization_batch_max_items)
+    
+    batches: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    
+    for item_id, line in item_lines.items():
+        cost = _estimate_tokens(line)
+        if current and (used + cost > budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item_id)
+        used += cost
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _categorize_batch(batch_ids: List[str], item_lines: Dict[str, str]) -> Dict[str, str]:
+    """
+    Categorize one batch of transactions with a single structured prompt.
+    
+    Returns:
+        Mapping of transaction id to category for every valid label returned;
+        ids that are missing or have an invalid label are left out
+    """
     try:
-        log_debug("Categorizing transaction", {"description": description[:50], "amount": amount})
-        
-        prompt = categorization_prompt(description, amount)
-        response = gemini_config(prompt)
-        category = response.text.strip()
+        prompt = batch_categorization_prompt([item_lines[item_id] for item_id in batch_ids])
+        response = await generate(prompt)
+        raw = json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+        labels = raw.get("categories", raw) if isinstance(raw, dict) else {}
         
-        # Validate category
-        if category in CATEGORIES:
-            log_debug("Transaction categorized successfully", {"category": category})
-            return category
-        else:
-            log_warning("AI returned invalid category, defaulting to 'Other'", {"returned_category": category, "description": description[:50]})
-            return "Other"
-            
+        # Anything but an id-to-category mapping counts as an empty answer,
+        # so every item in the batch is retried on its own
+        if not isinstance(labels, dict):
+            log_warning("LLM returned malformed batch categories", {"batch_size": len(batch_ids), "type": type(labels).__name__})
+            labels = {}
+    except LLMUnavailable:
+        log_debug("LLM unavailable, skipping categorization batch", {"batch_size": len(batch_ids)})
+        return {}
     except Exception as e:
-        log_error("Error categorizing transaction", error=e, context={"description": description[:50], "amount": amount})
-        return "Other"
+        log_error("Error categorizing transaction batch", error=e, context={"batch_size": len(batch_ids)})
+        return {}
+    
+    return {
+        item_id: labels[item_id]
+        for item_id in batch_ids
+        if isinstance(labels.get(item_id), str) and labels[item_id] in CATEGORIES
+    }
 
 
-async def categorize_transactions_batch(user_id: str, transaction_ids: List[str] = None) -> Dict[str, int]:
+async def categorize_transactions(
+    items: List[Dict],
+    user_id: Optional[str] = None,
+    stats: Optional[Dict[str, int]] = None
+) -> Dict[str, str]:
+    """
+    Categorize many transactions using the category cache, keyword rules, the
+    local model and batched Gemini prompts.
+    
+    Cached descriptions, keyword matches and confident model predictions are
+    resolved without an LLM call, and transactions sharing a normalized
+    description are sent to Gemini only once. The rest are packed into
+    prompts up to the configured token budget. Any transaction
+    the model skips or labels with an unknown category is retried on its own
+    with categorize_transaction.
+    
+    Args:
+        items: Dictionaries with id, description and amount
+        user_id: Optional user whose cached categories and rules should be used
+        stats: Optional dictionary that receives cache_hits, rule_hits,
+            model_hits and llm_items counts
+    
+    Returns:
+        Mapping of transaction id to category name
+    """
+    if not items:
+        return {}
+    
+    # A rule the user added outranks whatever was cached before it existed
+    user_rule_hits = await match_categories({
+        str(item["id"]): str(item["description"]) for item in items
+    }, user_id, user_rules_only=True)
+    categories = dict(user_rule_hits)
+    
+    keys = {str(item["id"]): cache_key(item["description"]) for item in items}
+    cached = await get_cached_categories([
+        item["description"] for item in items if str(item["id"]) not in categories
+    ], user_id)
+    cache_hits = {item_id: cached[key] for item_id, key in keys.items() if item_id not in categories and key in cached}
+    categories.update(cache_hits)
+    
+    # Obvious transactions are resolved locally by the built-in keyword rules
+    rule_hits = await match_categories({
+        str(item["id"]): str(item["description"])
+        for item in items
+        if str(item["id"]) not in categories
+    }, user_id)
+    categories.update(rule_hits)
+    rule_hits.update(user_rule_hits)
+    
+    # The local model answers when it is confident enough
+    ranked = await predict_categories({
+        str(item["id"]): str(item["description"])
+        for item in items
+        if str(item["id"]) not in categories
+    }, user_id, top_k=1)
+    model_hits = {
+        item_id: candidates[0][0]
+        for item_id, candidates in ranked.items()
+        if candidates and candidates[0][1] >= settings.category_model_confidence_threshold
+    }
+    categories.update(model_hits)
+    
+    # One representative transaction per uncached description; descriptions
+    # without a specific key (e.g. checks) are each asked about separately
+    representatives: Dict[str, Dict] = {}
+    for item in items:
+        item_id = str(item["id"])
+        if item_id not in categories:
+            representatives.setdefault(keys[item_id] or item_id, item)
+    
+    item_lines = {
+        str(item["id"]): batch_categorization_item(str(item["id"]), str(item["description"]), item["amount"])
+        for item in representatives.values()
+    }
+    
+    # Batches run concurrently; the LLM gateway bounds concurrency and rate
+    answered: Dict[str, str] = {}
+    batches = _pack_batches(item_lines)
+    for labels in await asyncio.gather(*(_categorize_batch(batch_ids, item_lines) for batch_ids in batches)):
+        answered.update(labels)
+    
+    # Remember batch answers; single retries are cached by categorize_transaction
+    await cache_categories({
+        str(item["description"]): answered[str(item["id"])]
+        for item in representatives.values()
+        if str(item["id"]) in answered
+    }, user_id)
+    
+    # Retry missing or invalid labels individually
+    retry = [item for item in representatives.values() if str(item["id"]) not in answered]
+    retried = await asyncio.gather(*(
+        categorize_transaction(item["description"], item["amount"], user_id) for item in retry
+    ))
+    answered.update({str(item["id"]): category for item, category in zip(retry, retried)})
+    
+    # Share each answer with every transaction that has the same description key
+    by_key = {keys[str(item["id"])] or str(item["id"]): answered[str(item["id"])] for item in representatives.values()}
+    for item_id, key in keys.items():
+        if item_id not in categories:
+            categories[item_id] = by_key[key or item_id]
+    
+    if stats is not None:
+        stats["cache_hits"] = stats.get("cache_hits", 0) + len(cache_hits)
+        stats["rule_hits"] = stats.get("rule_hits", 0) + len(rule_hits)
+        stats["model_hits"] = stats.get("model_hits", 0) + len(model_hits)
+        stats["llm_items"] = stats.get("llm_items", 0) + len(items) - len(cache_hits) - len(rule_hits) - len(model_hits)
+    
+    log_debug("Batch categorization completed", {
+        "items": len(items),
+        "cache_hits": len(cache_hits),
+        "rule_hits": len(rule_hits),
+        "model_hits": len(model_hits),
+        "prompts": len(batches),
+        "retried": len(retry)
+    })
+    return categories
+
+
+def _write_categories(user_id: str, categories: Dict[str, str]) -> Dict:
+    """
+    Write categories back with one set-based update per category.
+    
+    Ids are chunked so each `in` filter stays short enough for the URL. A
+    failed update only fails the ids in its own chunk.
+    
+    Returns:
+        Dictionary with updated and failed counts and any errors
+    """
+    supabase = get_supabase_admin()
+    
+    ids_by_category: Dict[str, List[str]] = defaultdict(list)
+    for transaction_id, category in categories.items():
+        ids_by_category[category].append(transaction_id)
+    
+    updated = 0
+    failed = 0
+    errors: List[str] = []
+    
+    for category, ids in ids_by_category.items():
+        for start in range(0, len(ids), CATEGORY_UPDATE_BATCH_SIZE):
+            chunk = ids[start:start + CATEGORY_UPDATE_BATCH_SIZE]
+            try:
+                result = (
+                    supabase.table("transactions")
+                    .update({"category": category})
+                    .in_("id", chunk)
+                    .eq("user_id", user_id)
+                    .execute()
+                )
+                updated += len(result.data)
+                failed += len(chunk) - len(result.data)
+            except Exception as e:
+                log_error("Error writing transaction categories", error=e, context={"category": category, "count": len(chunk)})
+                failed += len(chunk)
+                errors.append(f"{category}: {e}")
+    
+    return {"updated": updated, "failed": failed, "errors": errors}
+
+
+async def categorize_transactions_batch(user_id: str, transaction_ids: List[str] = None) -> Dict:
     """
     Categorize multiple transactions for a user.
     
     Args:
         user_id: User ID
         transaction_ids: Optional list of specific transaction IDs to categorize
-        
+    
     Returns:
-        Dictionary with count of categorized transactions
+        Dictionary with counts of categorized and failed transactions
     """
     log_info("Starting batch categorization", {"user_id": user_id, "specific_ids": bool(transaction_ids)})
     
     supabase = get_supabase_admin()
+    columns = "id, date, description, amount"
     
-    # Get uncategorized transactions or specific ones
+    # Get specific transactions, or the whole uncategorized backlog page by
+    # page, since a single request is capped at PostgREST's max-rows
     if transaction_ids:
-        query = supabase.table("transactions").select("*").in_("id", transaction_ids).eq("user_id", user_id)
+        pages = [supabase.table("transactions").select(columns).in_("id", transaction_ids).eq("user_id", user_id).execute().data]
     else:
-        query = supabase.table("transactions").select("*").eq("user_id", user_id).eq("category", "Uncategorized")
+        pages = iter_transaction_pages(user_id, columns, category="Uncategorized")
     
-    result = query.execute()
-    transactions = result.data
+    total = 0
+    updated = 0
+    failed = 0
+    errors: List[str] = []
+    stats: Dict[str, int] = {}
     
-    log_info(f"Found transactions to categorize", {"user_id": user_id, "count": len(transactions)})
-    
-    categorized_count = 0
-    
-    for transaction in transactions:
-        category = await categorize_transaction(
-            transaction["description"],
-            transaction["amount"]
-        )
+    for transactions in pages:
+        total += len(transactions)
+        log_debug("Categorizing page of transactions", {"user_id": user_id, "count": len(transactions)})
         
-        # Update the transaction
-        supabase.table("transactions").update({"category": category}).eq("id", transaction["id"]).execute()
-        categorized_count += 1
+        categories = await categorize_transactions(transactions, user_id, stats)
+        written = await asyncio.to_thread(_write_categories, user_id, categories)
+        updated += written["updated"]
+        failed += written["failed"]
+        errors.extend(written["errors"])
+    
+    log_info("Batch categorization completed", {
+        "user_id": user_id,
+        "total": total,
+        "categorized": updated,
+        "failed": failed
+    })
     
-    log_info("Batch categorization completed", {"user_id": user_id, "total": len(transactions), "categorized": categorized_count})
+    resolved_locally = stats.get("cache_hits", 0) + stats.get("rule_hits", 0) + stats.get("model_hits", 0)
     
     return {
-        "total": len(transactions),
-        "categorized": categorized_count
+        "total": total,
+        "categorized": updated,
+        "failed": failed,
+        "errors": errors[:10],  # Return first 10 errors
+        "resolved_locally": resolved_locally,
+        "local_share": round(resolved_locally / total, 4) if total else 0.0
     }
 
 
-async def suggest_category(description: str, amount: float) -> Dict[str, any]:
+async def suggest_category(description: str, amount: float, user_id: Optional[str] = None) -> Dict[str, any]:
     """
     Suggest a category for a transaction without saving.
     
     Args:
         description: Transaction description
         amount: Transaction amount
-        
+        user_id: Optional user whose cached categories and model should be used
+    
     Returns:
-        Dictionary with category and confidence
+        Dictionary with category, its source ('rule', 'cache', 'model', 'llm'
+        or 'fallback') and, only when the local model chose it, the model's
+        probability and its next most likely alternatives
     """
     log_debug("Suggesting category for transaction", {"description": description[:50], "amount": amount})
     
-    category = await categorize_transaction(description, amount)
+    # One prediction pass serves both the decision and the alternatives
+    ranked = await predict_category(description, user_id, top_k=len(CATEGORIES))
+    category, source = await _resolve_category(description, amount, user_id, ranked)
+    
+    # Probabilities describe the model's choice, not a rule, cache or LLM answer
+    if source != "model":
+        return {"category": category, "source": source, "confidence": None, "alternatives": []}
     
     return {
         "category": category,
-        "confidence": 0.85,  # Placeholder - could be enhanced with actual confidence scoring
-        "alternatives": []  # Could be enhanced to return alternative categories
+        "source": source,
+        "confidence": ranked[0][1],
+        "alternatives": [
+            {"category": alternative, "confidence": probability}
+            for alternative, probability in ranked[1:SUGGESTION_ALTERNATIVES + 1]
+        ]
     }
@@ -0,0 +1,217 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import settings
+from src.database import get_supabase_admin
+from src.utils.logging import *
+from src.utils.merchant import canonicalize_merchant
+
+# Entries are cached per user; callers without a user share this scope
+GLOBAL_SCOPE = "global"
+
+# PostgREST filters travel in the URL, so keep `in` lists short
+STORE_LOOKUP_BATCH_SIZE = 100
+
+# Words that say how money moved rather than to whom; with the check or
+# reference number dropped, a key made only of these names no merchant
+GENERIC_DESCRIPTOR_WORDS = frozenset({
+    "ach", "atm", "bill", "card", "cash", "check", "cheque", "chk", "credit", "debit",
+    "deposit", "from", "mobile", "no", "online", "pay", "payment", "pmt", "pos",
+    "purchase", "ref", "reference", "to", "transaction", "transfer", "txn", "wire",
+    "withdrawal", "xfer",
+})
+
+# In-process LRU tier: (scope, key) -> (category, expires_at)
+_memory: "OrderedDict[Tuple[str, str], Tuple[str, datetime]]" = OrderedDict()
+
+_stats = {
+    "memory_hits": 0,
+    "store_hits": 0,
+    "misses": 0,
+    "writes": 0,
+}
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normalize a transaction description into a cache key.
+    
+    The key is the canonical merchant, so "UBER *TRIP 8AB12" and "Uber Trip"
+    share a key.
+    """
+    return canonicalize_merchant(description)
+
+
+def cache_key(description: str) -> str:
+    """
+    Get the key a description's category is cached and shared under.
+    
+    Returns:
+        The normalized description, or an empty string if it is only a
+        generic payment descriptor: "CHECK 1032" and "CHECK 1033" both
+        normalize to "check" but can pay for anything
+    """
+    key = normalize_description(description)
+    if all(token in GENERIC_DESCRIPTOR_WORDS for token in key.split()):
+        return ""
+    return key
+
+
+def _ttl() -> timedelta:
+    return timedelta(days=settings.category_cache_ttl_days)
+
+
+def _memory_get(scope: str, key: str) -> Optional[str]:
+    entry = _memory.get((scope, key))
+    if not entry:
+        return None
+    
+    category, expires_at = entry
+    if expires_at <= datetime.now(timezone.utc):
+        del _memory[(scope, key)]
+        return None
+    
+    _memory.move_to_end((scope, key))
+    return category
+
+
+def _memory_put(scope: str, key: str, category: str, source: str, updated_at: Optional[datetime] = None):
+    # User corrections never expire; LLM answers are refreshed after the TTL
+    if source == "user":
+        expires_at = datetime.max.replace(tzinfo=timezone.utc)
+    else:
+        expires_at = (updated_at or datetime.now(timezone.utc)) + _ttl()
+    _memory[(scope, key)] = (category, expires_at)
+    _memory.move_to_end((scope, key))
+    
+    while len(_memory) > settings.category_cache_max_entries:
+        _memory.popitem(last=False)
+
+
+def _store_get(scope: str, keys: List[str]) -> Dict[str, Tuple[str, str, datetime]]:
+    """Fetch corrections and fresh LLM entries for the given scope and keys from the persistent store."""
+    supabase = get_supabase_admin()
+    cutoff = (datetime.now(timezone.utc) - _ttl()).strftime("%Y-%m-%dT%H:%M:%SZ")
+    entries = {}
+    
+    for start in range(0, len(keys), STORE_LOOKUP_BATCH_SIZE):
+        result = (
+            supabase.table("category_cache")
+            .select("description_key, category, source, updated_at")
+            .eq("scope", scope)
+            .in_("description_key", keys[start:start + STORE_LOOKUP_BATCH_SIZE])
+            .or_(f"source.eq.user,updated_at.gte.{cutoff}")
+            .execute()
+        )
+        for row in result.data:
+            updated_at = datetime.fromisoformat(row["updated_at"].replace('Z', '+00:00'))
+            entries[row["description_key"]] = (row["category"], row["source"], updated_at)
+    
+    return entries
+
+
+def _store_put(scope: str, entries: Dict[str, str], source: str):
+    """Upsert entries into the persistent store."""
+    supabase = get_supabase_admin()
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {"scope": scope, "description_key": key, "category": category, "source": source, "updated_at": now}
+        for key, category in entries.items()
+    ]
+    supabase.table("category_cache").upsert(rows, on_conflict="scope,description_key").execute()
+
+
+async def get_cached_categories(descriptions: Iterable[str], user_id: Optional[str] = None) -> Dict[str, str]:
+    """
+    Look up cached categories for many descriptions at once.
+    
+    The in-process LRU is checked first; the remaining keys are fetched from
+    the persistent store in bulk, in a worker thread so the event loop is not
+    blocked on the round trip.
+    
+    Args:
+        descriptions: Transaction descriptions
+        user_id: User whose cache should be consulted
+    
+    Returns:
+        Mapping of normalized description key to category for every hit
+    """
+    scope = user_id or GLOBAL_SCOPE
+    keys = {cache_key(description) for description in descriptions}
+    keys.discard("")
+    
+    found: Dict[str, str] = {}
+    missing: List[str] = []
+    for key in keys:
+        category = _memory_get(scope, key)
+        if category:
+            found[key] = category
+        else:
+            missing.append(key)
+    _stats["memory_hits"] += len(found)
+    
+    if missing:
+        try:
+            stored = await asyncio.to_thread(_store_get, scope, missing)
+        except Exception as e:
+            log_error("Error reading category cache store", error=e, context={"keys": len(missing)})
+            stored = {}
+        
+        for key, (category, source, updated_at) in stored.items():
+            _memory_put(scope, key, category, source, updated_at)
+            found[key] = category
+        
+        _stats["store_hits"] += len(stored)
+        _stats["misses"] += len(missing) - len(stored)
+    
+    return found
+
+
+async def get_cached_category(description: str, user_id: Optional[str] = None) -> Optional[str]:
+    """Look up the cached category for a single description."""
+    found = await get_cached_categories([description], user_id)
+    return found.get(cache_key(description))
+
+
+async def cache_categories(entries: Dict[str, str], user_id: Optional[str] = None, source: str = "llm"):
+    """
+    Store categories for descriptions in both cache tiers.
+    
+    Args:
+        entries: Mapping of description to category
+        user_id: User the entries belong to
+        source: Where the category came from ('llm' or 'user')
+    """
+    scope = user_id or GLOBAL_SCOPE
+    keyed = {cache_key(description): category for description, category in entries.items()}
+    keyed.pop("", None)
+    if not keyed:
+        return
+    
+    for key, category in keyed.items():
+        _memory_put(scope, key, category, source)
+    _stats["writes"] += len(keyed)
+    
+    try:
+        await asyncio.to_thread(_store_put, scope, keyed, source)
+    except Exception as e:
+        log_error("Error writing category cache store", error=e, context={"entries": len(keyed)})
+
+
+async def record_category_correction(user_id: str, description: str, category: str):
+    """Overwrite the user's cached category for a description after a manual correction."""
+    log_debug("Recording category correction", {"user_id": user_id, "description": description[:50], "category": category})
+    await cache_categories({description: category}, user_id, source="user")
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Return hit/miss counters and the size of the in-process tier."""
+    lookups = _stats["memory_hits"] + _stats["store_hits"] + _stats["misses"]
+    hits = _stats["memory_hits"] + _stats["store_hits"]
+    return {
+        **_stats,
+        "memory_entries": len(_memory),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,307 @@
+import asyncio
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from src.config import settings
+from src.database import POSTGREST_MAX_ROWS, get_supabase_admin, keyset_filter
+from src.services.category_cache import normalize_description
+from src.utils.logging import *
+from src.utils.prompt import CATEGORIES, CATEGORY_KEYWORDS
+
+# Models are cached per user; the global model is trained without any user data
+GLOBAL_MODEL = "global"
+
+# Manual corrections count for more than categories the pipeline assigned
+CORRECTION_WEIGHT = 5.0
+
+# Category the pipeline assigns when it has no usable answer
+FALLBACK_CATEGORY = "Other"
+
+# Passes over the training set when a model is first built
+TRAINING_EPOCHS = 5
+
+# Users without enough labelled data are not retried before this has passed
+UNTRAINED_RETRY = timedelta(minutes=30)
+
+# Stateless, so a single vectorizer is shared by every model. Each model's
+# coef_ is classes x n_features float64, about 8 MB at 2 ** 16 features
+_vectorizer = HashingVectorizer(
+    analyzer="char_wb",
+    ngram_range=(2, 4),
+    n_features=2 ** 16,
+    alternate_sign=False,
+    norm="l2",
+)
+_classes = np.array(CATEGORIES)
+
+# In-process LRU of trained models, keyed by user id (or GLOBAL_MODEL)
+_models: "OrderedDict[str, CategoryModel]" = OrderedDict()
+_training_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+_untrained: Dict[str, datetime] = {}
+
+_stats = {
+    "trained": 0,
+    "incremental_updates": 0,
+    "predictions": 0,
+}
+
+
+class CategoryModel:
+    """A linear classifier over hashed character n-grams of transaction descriptions."""
+
+    def __init__(self):
+        # Logistic loss, so predict_proba returns probabilities rather than margins
+        self.classifier = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0)
+        self.samples = 0
+        self.trained_at = datetime.now()
+
+    def fit(self, descriptions: List[str], labels: List[str], weights: List[float]):
+        """Train from scratch with a few shuffled passes of partial_fit."""
+        features = _vectorizer.transform([normalize_description(d) for d in descriptions])
+        targets = np.array(labels)
+        sample_weight = np.array(weights)
+        rng = np.random.default_rng(0)
+        
+        for _ in range(TRAINING_EPOCHS):
+            order = rng.permutation(len(targets))
+            self.classifier.partial_fit(features[order], targets[order], classes=_classes, sample_weight=sample_weight[order])
+        
+        self.samples = len(targets)
+        self.trained_at = datetime.now()
+
+    def update(self, description: str, category: str, weight: float = CORRECTION_WEIGHT):
+        """Fold a single labelled description into the model."""
+        features = _vectorizer.transform([normalize_description(description)])
+        self.classifier.partial_fit(features, [category], classes=_classes, sample_weight=[weight])
+        self.samples += 1
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the model's weights."""
+        return self.classifier.coef_.nbytes + self.classifier.intercept_.nbytes
+
+    def rank(self, descriptions: List[str], top_k: int) -> List[List[Tuple[str, float]]]:
+        """Return the top-k (category, probability) pairs for each description."""
+        features = _vectorizer.transform([normalize_description(d) for d in descriptions])
+        scores = np.asarray(features @ self.classifier.coef_.T) + self.classifier.intercept_
+        
+        # Same one-vs-rest normalization SGDClassifier.predict_proba applies
+        probabilities = 1.0 / (1.0 + np.exp(-scores))
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        best = np.argsort(-probabilities, axis=1)[:, :top_k]
+        
+        return [
+            [(str(self.classifier.classes_[i]), round(float(row[i]), 4)) for i in indices]
+            for row, indices in zip(probabilities, best)
+        ]
+
+
+def _load_cache_entries(scope: str, source: Optional[str] = None) -> List[Dict]:
+    """Category cache entries of a scope, paged by key, up to CATEGORY_MODEL_TRAINING_ROWS."""
+    supabase = get_supabase_admin()
+    rows: List[Dict] = []
+    
+    while len(rows) < settings.category_model_training_rows:
+        query = supabase.table("category_cache").select("description_key, category, source").eq("scope", scope)
+        if source:
+            query = query.eq("source", source)
+        if rows:
+            query = query.or_(keyset_filter([("description_key", rows[-1]["description_key"])]))
+        
+        page = query.order("description_key").limit(POSTGREST_MAX_ROWS).execute().data
+        rows.extend(page)
+        if len(page) < POSTGREST_MAX_ROWS:
+            break
+    
+    return rows[:settings.category_model_training_rows]
+
+
+def _load_global_training_data() -> Tuple[List[str], List[str], List[float]]:
+    """Built-in keywords plus categories cached for callers without a user."""
+    descriptions = [keyword for keywords in CATEGORY_KEYWORDS.values() for keyword in keywords]
+    labels = [category for category, keywords in CATEGORY_KEYWORDS.items() for _ in keywords]
+    weights = [1.0] * len(labels)
+    
+    for row in _load_cache_entries(GLOBAL_MODEL):
+        # "Other" from the LLM is also what an invalid answer is recorded as
+        if row["category"] in CATEGORIES and (row["source"] == "user" or row["category"] != FALLBACK_CATEGORY):
+            descriptions.append(row["description_key"])
+            labels.append(row["category"])
+            weights.append(CORRECTION_WEIGHT if row["source"] == "user" else 1.0)
+    
+    return descriptions, labels, weights
+
+
+def _load_user_training_data(user_id: str) -> Tuple[List[str], List[str], List[float]]:
+    """
+    The user's confirmed categories: manually entered transactions and corrections.
+    
+    Imported rows are left out, since their categories were assigned by the
+    pipeline itself (cache, rules, this model or the LLM) and training on
+    them would feed its mistakes back in.
+    """
+    # Imported here because the transactions service imports this module
+    from src.services.transactions import iter_transaction_pages
+    
+    # Only the most recent manual rows are kept
+    manual = deque(maxlen=settings.category_model_training_rows)
+    for page in iter_transaction_pages(user_id, "id, date, description, category", source="manual"):
+        # Manual rows saved without a category are filled in by the pipeline,
+        # whose fallback is "Other"
+        manual.extend(row for row in page if row["category"] in CATEGORIES and row["category"] != FALLBACK_CATEGORY)
+    
+    descriptions = [row["description"] for row in manual]
+    labels = [row["category"] for row in manual]
+    weights = [1.0] * len(labels)
+    
+    for row in _load_cache_entries(user_id, source="user"):
+        if row["category"] in CATEGORIES:
+            descriptions.append(row["description_key"])
+            labels.append(row["category"])
+            weights.append(CORRECTION_WEIGHT)
+    
+    return descriptions, labels, weights
+
+
+def _train_model(model_id: str) -> Optional[CategoryModel]:
+    """
+    Train a model from stored data.
+    
+    Returns:
+        The trained model, or None if there is not enough labelled data
+    """
+    if model_id == GLOBAL_MODEL:
+        descriptions, labels, weights = _load_global_training_data()
+    else:
+        descriptions, labels, weights = _load_user_training_data(model_id)
+        if len(labels) < settings.category_model_min_samples:
+            return None
+    
+    model = CategoryModel()
+    model.fit(descriptions, labels, weights)
+    return model
+
+
+def _cache_model(model_id: str, model: CategoryModel):
+    """Cache a model, evicting the least recently used beyond CATEGORY_MODEL_CACHE_MB."""
+    _models[model_id] = model
+    _models.move_to_end(model_id)
+    
+    budget = settings.category_model_cache_mb * 1024 * 1024
+    while len(_models) > 1 and _cached_bytes() > budget:
+        _models.popitem(last=False)
+
+
+def _cached_bytes() -> int:
+    return sum(model.nbytes for model in _models.values())
+
+
+async def _get_model(model_id: str) -> Optional[CategoryModel]:
+    """Return a cached model, training it in a worker thread on first use."""
+    model = _models.get(model_id)
+    if model:
+        _models.move_to_end(model_id)
+        return model
+    
+    retry_at = _untrained.get(model_id)
+    if retry_at and retry_at > datetime.now():
+        return None
+    
+    async with _training_locks[model_id]:
+        # Another request may have trained it while we waited
+        model = _models.get(model_id)
+        if model:
+            return model
+        
+        try:
+            model = await asyncio.to_thread(_train_model, model_id)
+        except Exception as e:
+            log_error("Error training category model", error=e, context={"model": model_id})
+            _untrained[model_id] = datetime.now() + UNTRAINED_RETRY
+            return None
+        
+        if model is None:
+            _untrained[model_id] = datetime.now() + UNTRAINED_RETRY
+            return None
+        
+        _untrained.pop(model_id, None)
+        _cache_model(model_id, model)
+        _stats["trained"] += 1
+        log_debug("Category model trained", {"model": model_id, "samples": model.samples})
+        return model
+
+
+async def predict_categories(
+    descriptions: Dict[str, str],
+    user_id: Optional[str] = None,
+    top_k: int = 3
+) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    Rank likely categories for many descriptions with the local model.
+    
+    The user's own model is used once they have enough categorized
+    transactions; otherwise the global model is used.
+    
+    Args:
+        descriptions: Mapping of transaction id to description
+        user_id: Optional user whose model should be used
+        top_k: Number of categories to return per description
+    
+    Returns:
+        Mapping of transaction id to (category, probability) pairs, most likely
+        first; empty if no model is available
+    """
+    if not descriptions:
+        return {}
+    
+    model = None
+    if user_id:
+        model = await _get_model(user_id)
+    if model is None:
+        model = await _get_model(GLOBAL_MODEL)
+    if model is None:
+        return {}
+    
+    ids = list(descriptions)
+    ranked = model.rank([str(descriptions[item_id]) for item_id in ids], top_k)
+    _stats["predictions"] += len(ids)
+    return dict(zip(ids, ranked))
+
+
+async def predict_category(description: str, user_id: Optional[str] = None, top_k: int = 3) -> List[Tuple[str, float]]:
+    """Rank likely categories for a single description."""
+    ranked = await predict_categories({"0": description}, user_id, top_k)
+    return ranked.get("0", [])
+
+
+async def learn_category(user_id: str, description: str, category: str):
+    """
+    Update the user's cached model with a confirmed category.
+    
+    Users without a cached model pick the change up from storage the next
+    time their model is trained.
+    """
+    model = _models.get(user_id)
+    if model is None or category not in CATEGORIES:
+        return
+    
+    try:
+        model.update(description, category)
+        _stats["incremental_updates"] += 1
+    except Exception as e:
+        log_error("Error updating category model", error=e, context={"user_id": user_id})
+
+
+def get_model_stats() -> Dict:
+    """Return training/prediction counters and the models currently cached."""
+    return {
+        **_stats,
+        "cached_models": len(_models),
+        "cached_mb": round(_cached_bytes() / (1024 * 1024), 1),
+        "confidence_threshold": settings.category_model_confidence_threshold,
+    }
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.database import get_supabase_admin
+from src.utils.keyword_matcher import KeywordMatcher
+from src.utils.logging import *
+from src.utils.prompt import CATEGORY_KEYWORDS
+
+# User rules outrank the built-in ones when both match
+DEFAULT_RULE_PRIORITY = 0
+USER_RULE_PRIORITY = 1
+
+# Compiled matchers are kept for the most recently active users
+MAX_CACHED_MATCHERS = 1000
+
+DEFAULT_RULES = [
+    {"id": None, "keyword": keyword, "category": category, "source": "default"}
+    for category, keywords in CATEGORY_KEYWORDS.items()
+    for keyword in keywords
+]
+
+_default_matcher = KeywordMatcher(
+    (rule["keyword"], rule["category"], DEFAULT_RULE_PRIORITY) for rule in DEFAULT_RULES
+)
+_matchers: "OrderedDict[str, KeywordMatcher]" = OrderedDict()
+
+_stats = {
+    "matched": 0,
+    "unmatched": 0,
+}
+
+
+def _load_user_rules(user_id: str) -> List[Dict]:
+    """Fetch a user's own keyword rules."""
+    supabase = get_supabase_admin()
+    result = supabase.table("category_rules").select("*").eq("user_id", user_id).order("created_at").execute()
+    return result.data
+
+
+def _get_matcher(user_id: Optional[str]) -> KeywordMatcher:
+    """Return the compiled matcher for a user, building it on first use."""
+    if not user_id:
+        return _default_matcher
+    
+    matcher = _matchers.get(user_id)
+    if matcher:
+        _matchers.move_to_end(user_id)
+        return matcher
+    
+    try:
+        user_rules = _load_user_rules(user_id)
+    except Exception as e:
+        log_error("Error loading category rules, using defaults", error=e, context={"user_id": user_id})
+        return _default_matcher
+    
+    matcher = KeywordMatcher(
+        [(rule["keyword"], rule["category"], DEFAULT_RULE_PRIORITY) for rule in DEFAULT_RULES]
+        + [(rule["keyword"], rule["category"], USER_RULE_PRIORITY) for rule in user_rules]
+    )
+    _matchers[user_id] = matcher
+    if len(_matchers) > MAX_CACHED_MATCHERS:
+        _matchers.popitem(last=False)
+    return matcher
+
+
+async def match_categories(
+    descriptions: Dict[str, str],
+    user_id: Optional[str] = None,
+    user_rules_only: bool = False
+) -> Dict[str, str]:
+    """
+    Categorize descriptions locally with the keyword rules.
+    
+    Args:
+        descriptions: Mapping of transaction id to description
+        user_id: Optional user whose own rules should be applied
+        user_rules_only: Match only the user's own rules, which outrank
+            cached categories, and leave the built-in rules for a later pass
+    
+    Returns:
+        Mapping of transaction id to category for every description that matched
+    """
+    if user_rules_only and not user_id:
+        return {}
+    
+    matcher = _get_matcher(user_id)
+    min_priority = USER_RULE_PRIORITY if user_rules_only else None
+    matched = {}
+    for item_id, description in descriptions.items():
+        category = matcher.match(description, min_priority)
+        if category:
+            matched[item_id] = category
+    
+    # Misses of the user-rules pass are counted by the full pass that follows
+    _stats["matched"] += len(matched)
+    if not user_rules_only:
+        _stats["unmatched"] += len(descriptions) - len(matched)
+    return matched
+
+
+async def match_category(description: str, user_id: Optional[str] = None, user_rules_only: bool = False) -> Optional[str]:
+    """Categorize a single description locally, if a keyword rule matches."""
+    matched = await match_categories({"0": description}, user_id, user_rules_only)
+    return matched.get("0")
+
+
+async def list_rules(user_id: str) -> List[Dict]:
+    """List the built-in rules followed by the user's own rules."""
+    user_rules = [{**rule, "source": "user"} for rule in _load_user_rules(user_id)]
+    return DEFAULT_RULES + user_rules
+
+
+async def create_rule(user_id: str, keyword: str, category: str) -> Optional[Dict]:
+    """Add a keyword rule for a user and recompile their matcher."""
+    supabase = get_supabase_admin()
+    
+    result = supabase.table("category_rules").insert({
+        "user_id": user_id,
+        "keyword": " ".join(keyword.lower().split()),
+        "category": category,
+    }).execute()
+    
+    _matchers.pop(user_id, None)
+    log_info("Category rule created", {"user_id": user_id, "keyword": keyword, "category": category})
+    return {**result.data[0], "source": "user"} if result.data else None
+
+
+async def delete_rule(user_id: str, rule_id: str) -> bool:
+    """Delete one of the user's keyword rules and recompile their matcher."""
+    supabase = get_supabase_admin()
+    
+    result = supabase.table("category_rules").delete().eq("id", rule_id).eq("user_id", user_id).execute()
+    
+    _matchers.pop(user_id, None)
+    return len(result.data) > 0
+
+
+def get_rule_stats() -> Dict:
+    """Return how many descriptions the keyword rules resolved locally."""
+    total = _stats["matched"] + _stats["unmatched"]
+    return {
+        **_stats,
+        "cached_matchers": len(_matchers),
+        "local_share": round(_stats["matched"] / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,155 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, List, Optional
+
+from src.config import settings
+from src.services.upload import parse_csv_file
+from src.utils.logging import *
+from src.utils.schema import CSVUploadResponse, ImportJobStatus
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class ImportJob:
+    """An import running in the background, with its uploaded file and task."""
+
+    def __init__(self, user_id: str, file_obj: BinaryIO, filename: str, file_extension: str):
+        self.user_id = user_id
+        self.file_obj = file_obj
+        self.file_extension = file_extension
+        self.status = ImportJobStatus(
+            job_id=str(uuid.uuid4()),
+            status="queued",
+            filename=filename,
+            created_at=datetime.now(),
+        )
+        self.task: Optional[asyncio.Task] = None
+
+
+# In-process job registry, keyed by job id
+_jobs: Dict[str, ImportJob] = {}
+
+# One semaphore per user bounds how many of their jobs run at once; dropped
+# when the user's last unfinished job ends
+_user_slots: Dict[str, asyncio.Semaphore] = defaultdict(
+    lambda: asyncio.Semaphore(max(1, settings.import_jobs_per_user))
+)
+
+
+def _prune_finished_jobs():
+    """Forget finished jobs once they are past the retention window."""
+    cutoff = datetime.now() - timedelta(minutes=settings.import_job_retention_minutes)
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job.status.status in FINISHED_STATUSES and job.status.finished_at and job.status.finished_at < cutoff
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+async def _run_import_job(job: ImportJob):
+    """Wait for a free slot for the user, then run the import."""
+    status = job.status
+    try:
+        async with _user_slots[job.user_id]:
+            status.status = "running"
+            status.started_at = datetime.now()
+            log_info("Import job started", {"job_id": status.job_id, "user_id": job.user_id})
+            
+            result = await parse_csv_file(job.file_obj, job.user_id, job.file_extension, status.progress)
+            
+            status.result = CSVUploadResponse(**result)
+            status.status = "failed" if result["message"] == "Failed to parse CSV" else "completed"
+            log_info("Import job finished", {"job_id": status.job_id, "status": status.status})
+    except asyncio.CancelledError:
+        status.status = "cancelled"
+        log_info("Import job cancelled", {"job_id": status.job_id, "user_id": job.user_id})
+    except Exception as e:
+        status.status = "failed"
+        log_error("Import job failed", error=e, context={"job_id": status.job_id, "user_id": job.user_id})
+    finally:
+        status.finished_at = datetime.now()
+        job.file_obj.close()
+        
+        # Forget the user's semaphore once none of their jobs is queued or running
+        if not any(
+            other.user_id == job.user_id and other.status.status not in FINISHED_STATUSES
+            for other in _jobs.values()
+        ):
+            _user_slots.pop(job.user_id, None)
+
+
+async def submit_import_job(user_id: str, file_obj: BinaryIO, filename: str, file_extension: str) -> Optional[Dict]:
+    """
+    Queue an uploaded file for import in the background.
+    
+    Args:
+        user_id: User ID
+        file_obj: Binary file object holding the upload; the job takes
+            ownership and closes it when finished
+        filename: Original file name
+        file_extension: File extension (.csv or .xlsx)
+    
+    Returns:
+        The job status, or None if the user already has too many unfinished jobs
+    """
+    _prune_finished_jobs()
+    
+    unfinished = [
+        job for job in _jobs.values()
+        if job.user_id == user_id and job.status.status not in FINISHED_STATUSES
+    ]
+    if len(unfinished) >= settings.import_max_queued_jobs_per_user:
+        log_warning("Import job rejected, too many unfinished jobs", {"user_id": user_id, "unfinished": len(unfinished)})
+        return None
+    
+    job = ImportJob(user_id, file_obj, filename, file_extension)
+    _jobs[job.status.job_id] = job
+    job.task = asyncio.create_task(_run_import_job(job))
+    
+    log_info("Import job queued", {"job_id": job.status.job_id, "user_id": user_id, "filename": filename})
+    return job.status.model_dump()
+
+
+async def get_import_job(user_id: str, job_id: str) -> Optional[Dict]:
+    """Get the status of one of the user's import jobs."""
+    _prune_finished_jobs()
+    
+    job = _jobs.get(job_id)
+    if not job or job.user_id != user_id:
+        return None
+    return job.status.model_dump()
+
+
+async def list_import_jobs(user_id: str) -> List[Dict]:
+    """List the user's import jobs, newest first."""
+    _prune_finished_jobs()
+    
+    jobs = [job.status for job in _jobs.values() if job.user_id == user_id]
+    jobs.sort(key=lambda status: status.created_at, reverse=True)
+    return [status.model_dump() for status in jobs]
+
+
+async def cancel_import_job(user_id: str, job_id: str) -> Optional[Dict]:
+    """
+    Cancel a queued or running import job.
+    
+    Rows already inserted by a running job are kept.
+    
+    Returns:
+        The job status after cancellation, or None if the job does not exist
+    """
+    job = _jobs.get(job_id)
+    if not job or job.user_id != user_id:
+        return None
+    
+    if job.status.status not in FINISHED_STATUSES and job.task:
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+    
+    return job.status.model_dump()
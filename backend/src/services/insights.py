@@ -1,93 +1,266 @@
+import asyncio
+import hashlib
 import json
-from datetime import datetime
-from typing import Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+from src.config import settings
 from src.database import get_supabase_admin
-from src.services.analytics import get_spending_summary, detect_anomalies, compare_monthly_trends
+from src.services.analytics import get_spending_summary, detect_anomalies, compare_monthly_trends, load_transaction_snapshot, analysis_window_start
 from src.utils.logging import *
-from src.utils.llm.gemini_config import gemini_config
-from src.utils.prompt import insights_prompt, format_financial_data
+from src.utils.llm.gateway import generate, generate_stream
+from src.utils.prompt import insights_prompt, format_financial_data, INSIGHTS_PROMPT_VERSION
 
+# Latest generated insight per user: user_id -> (context hash, insight, generated_at)
+_recent: Dict[str, Tuple[str, Dict, datetime]] = {}
 
-async def generate_insights(user_id: str, period: str = "month") -> Dict:
+
+def _context_hash(data_context: str) -> str:
+    """Hash the prompt version and data context into an insights cache key."""
+    return hashlib.sha256(f"{INSIGHTS_PROMPT_VERSION}\n{data_context}".encode()).hexdigest()
+
+
+def _parse_timestamp(value: str) -> datetime:
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def _get_cached_insight(user_id: str, context_hash: str) -> Optional[Dict]:
+    """
+    Return the freshest insight generated from the same data context, if it
+    is still within the TTL.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.insights_cache_ttl_hours)
+    
+    recent = _recent.get(user_id)
+    if recent and recent[0] == context_hash and recent[2] >= cutoff:
+        return recent[1]
+    
+    supabase = get_supabase_admin()
+    result = (
+        supabase.table("insights")
+        .select("summary, trend, advice, generated_at")
+        .eq("user_id", user_id)
+        .eq("context_hash", context_hash)
+        .gte("generated_at", cutoff.isoformat())
+        .order("generated_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return None
+    
+    row = result.data[0]
+    insight = {
+        "summary": row["summary"],
+        "insights": row["trend"],
+        "recommendations": row["advice"],
+        "generated_at": row["generated_at"],
+    }
+    _recent[user_id] = (context_hash, insight, _parse_timestamp(row["generated_at"]))
+    return insight
+
+
+async def _gather_financial_data(user_id: str) -> Tuple[Dict, List[Dict], Dict, str]:
+    """Compute the analytics an insight is based on, and the prompt context built from them."""
+    # The all-time summary is aggregated in Postgres (rollups or RPC); one
+    # fetch of the recent window feeds the anomaly and trend analytics
+    frame = await asyncio.to_thread(load_transaction_snapshot, user_id, analysis_window_start(months=3))
+    summary, anomalies, trends = await asyncio.gather(
+        get_spending_summary(user_id),
+        detect_anomalies(user_id, frame=frame),
+        compare_monthly_trends(user_id, months=3, frame=frame)
+    )
+    
+    # Prepare data for AI analysis
+    data_context = format_financial_data(summary, trends, anomalies)
+    return summary, anomalies, trends, data_context
+
+
+def _lookup_cached_insight(user_id: str, context_hash: str) -> Optional[Dict]:
+    """Cache lookup that treats a failing store as a miss."""
+    try:
+        return _get_cached_insight(user_id, context_hash)
+    except Exception as e:
+        log_error("Error reading cached insights", error=e, context={"user_id": user_id})
+        return None
+
+
+def _parse_insights(text: str) -> Dict:
+    """Parse the LLM's JSON answer into summary, insights and recommendations."""
+    insights_raw = json.loads(text.strip().replace("```json", "").replace("```", ""))
+    
+    # Extract data from the nested structure
+    return insights_raw.get("data", insights_raw)  # Handle both formats
+
+
+def _save_insights(user_id: str, context_hash: str, insights_data: Dict) -> Dict:
+    """Store a generated insight and remember it as the user's latest."""
+    supabase = get_supabase_admin()
+    generated_at = datetime.now(timezone.utc)
+    
+    # Save as a single row with all data
+    supabase.table("insights").insert({
+        "user_id": user_id,
+        "summary": insights_data["summary"],
+        "trend": insights_data["insights"],  # Array of trends
+        "advice": insights_data["recommendations"],  # Array of advice
+        "context_hash": context_hash,
+        "generated_at": generated_at.isoformat()
+    }).execute()
+    
+    log_info("Successfully generated and saved insights", {"user_id": user_id, "insights_count": len(insights_data["insights"])})
+    
+    insight = {
+        "summary": insights_data["summary"],
+        "insights": insights_data["insights"],
+        "recommendations": insights_data["recommendations"],
+        "generated_at": generated_at.isoformat(),
+    }
+    _recent[user_id] = (context_hash, insight, generated_at)
+    return insight
+
+
+def _fallback_insights(summary: Dict) -> Dict:
+    """Generic insights built from the summary when the LLM is unavailable."""
+    return {
+        "summary": f"You spent ${summary['total_expense']} this period with a net of ${summary['net']}.",
+        "insights": [
+            f"Your top spending category is {summary['categories'][0]['category']} at ${summary['categories'][0]['total']}" if summary['categories'] else "No spending data available",
+            "Track your expenses regularly to identify patterns",
+            "Consider setting budget limits for each category"
+        ],
+        "recommendations": [
+            "Review your subscriptions and cancel unused ones",
+            "Set up automatic savings transfers",
+            "Create a monthly budget plan"
+        ],
+        "generated_at": datetime.now().isoformat(),
+    }
+
+
+async def generate_insights(user_id: str, period: str = "month", force_refresh: bool = False) -> Dict:
     """
     Generate AI-powered financial insights for a user.
     
+    Insights are cached by a hash of the formatted financial data and the
+    prompt version, so regenerating them for unchanged data returns the last
+    stored result without an LLM call.
+    
     Args:
         user_id: User ID
         period: Analysis period ('week', 'month', 'quarter', 'year')
-        
+        force_refresh: Ignore cached insights and call the LLM
+    
     Returns:
-        Dictionary with insights and recommendations
+        Dictionary with insights and recommendations, and whether they came
+        from the cache
     """
     log_info(f"Generating insights for user", {"user_id": user_id, "period": period})
     
     # Gather financial data
-    summary = await get_spending_summary(user_id)
-    anomalies = await detect_anomalies(user_id)
-    trends = await compare_monthly_trends(user_id, months=3)
+    summary, anomalies, trends, data_context = await _gather_financial_data(user_id)
+    context_hash = _context_hash(data_context)
+    
+    if not force_refresh:
+        cached = _lookup_cached_insight(user_id, context_hash)
+        if cached:
+            log_info("Returning cached insights", {"user_id": user_id})
+            return {
+                **cached,
+                "data_summary": summary,
+                "anomalies": anomalies[:3],  # Top 3 anomalies
+                "cached": True
+            }
     
-    # Prepare data for AI analysis
-    data_context = format_financial_data(summary, trends, anomalies)
-
     # Generate insights using Gemini
     try:
         log_debug("Calling Gemini API for insights generation")
         prompt = insights_prompt(data_context)
-        response = gemini_config(prompt)
+        response = await generate(prompt)
         
-        # Parse the response
-        insights_raw = json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+        insights_data = _parse_insights(response.text)
         log_debug("Successfully parsed AI response")
         
-        # Extract data from the nested structure
-        insights_data = insights_raw.get("data", insights_raw)  # Handle both formats
-        
-        # Save insights to database with new schema
-        supabase = get_supabase_admin()
-        
-        # Save as a single row with all data
-        result = supabase.table("insights").insert({
-            "user_id": user_id,
-            "summary": insights_data["summary"],
-            "trend": insights_data["insights"],  # Array of trends
-            "advice": insights_data["recommendations"],  # Array of advice
-            "generated_at": datetime.now().isoformat()
-        }).execute()
-        
-        log_info("Successfully generated and saved insights", {"user_id": user_id, "insights_count": len(insights_data["insights"])})
+        insight = _save_insights(user_id, context_hash, insights_data)
         
         return {
-            "summary": insights_data["summary"],
-            "insights": insights_data["insights"],
-            "recommendations": insights_data["recommendations"],
-            "generated_at": datetime.now().isoformat(),
+            **insight,
             "data_summary": summary,
-            "anomalies": anomalies[:3]  # Top 3 anomalies
+            "anomalies": anomalies[:3],  # Top 3 anomalies
+            "cached": False
         }
-        
+    
     except Exception as e:
         log_error("Error generating insights", error=e, context={"user_id": user_id})
         
         # Return fallback insights
         log_warning("Returning fallback insights due to error", {"user_id": user_id})
         return {
-            "summary": f"You spent ${summary['total_expense']} this period with a net of ${summary['net']}.",
-            "insights": [
-                f"Your top spending category is {summary['categories'][0]['category']} at ${summary['categories'][0]['total']}" if summary['categories'] else "No spending data available",
-                "Track your expenses regularly to identify patterns",
-                "Consider setting budget limits for each category"
-            ],
-            "recommendations": [
-                "Review your subscriptions and cancel unused ones",
-                "Set up automatic savings transfers",
-                "Create a monthly budget plan"
-            ],
-            "generated_at": datetime.now().isoformat(),
-            "data_summary": summary
+            **_fallback_insights(summary),
+            "data_summary": summary,
+            "cached": False
         }
 
 
+def _sse(event: str, data: Dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_insights(user_id: str, period: str = "month", force_refresh: bool = False) -> AsyncIterator[str]:
+    """
+    Generate insights as a stream of server-sent events.
+    
+    Events, in order:
+        context: data_summary and anomalies, sent as soon as analytics are done
+        delta: a piece of the LLM's JSON answer (only when not cached)
+        insight: the final parsed insight, with the cached flag; fallback
+            insights and an error message if generation failed
+        done: end of stream
+    
+    Args:
+        user_id: User ID
+        period: Analysis period ('week', 'month', 'quarter', 'year')
+        force_refresh: Ignore cached insights and call the LLM
+    
+    Yields:
+        Server-sent event strings
+    """
+    log_info(f"Streaming insights for user", {"user_id": user_id, "period": period})
+    
+    summary, anomalies, trends, data_context = await _gather_financial_data(user_id)
+    context_hash = _context_hash(data_context)
+    
+    yield _sse("context", {"data_summary": summary, "anomalies": anomalies[:3]})
+    
+    cached = None if force_refresh else _lookup_cached_insight(user_id, context_hash)
+    if cached:
+        yield _sse("insight", {**cached, "cached": True})
+        yield _sse("done", {})
+        return
+    
+    pieces: List[str] = []
+    stream = generate_stream(insights_prompt(data_context))
+    try:
+        # Close the LLM stream explicitly so a disconnected client stops it now, not at GC
+        try:
+            async for piece in stream:
+                pieces.append(piece)
+                yield _sse("delta", {"text": piece})
+        finally:
+            await stream.aclose()
+        
+        insights_data = _parse_insights("".join(pieces))
+        insight = _save_insights(user_id, context_hash, insights_data)
+        yield _sse("insight", {**insight, "cached": False})
+    except Exception as e:
+        log_error("Error streaming insights", error=e, context={"user_id": user_id})
+        yield _sse("insight", {**_fallback_insights(summary), "cached": False, "error": "Insight generation failed"})
+    
+    yield _sse("done", {})
+
+
 async def get_user_insights(user_id: str, limit: int = 10) -> List[Dict]:
     """
     Retrieve recent insights for a user.
@@ -95,7 +268,7 @@ async def get_user_insights(user_id: str, limit: int = 10) -> List[Dict]:
     Args:
         user_id: User ID
         limit: Maximum number of insights to return
-        
+    
     Returns:
         List of insights with summary, trends, and advice
     """
@@ -0,0 +1,119 @@
+import sys
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from src.config import settings
+from src.database import POSTGREST_MAX_ROWS, get_supabase_admin, keyset_filter
+from src.utils.logging import *
+
+# Per user, month, category and type totals, kept in step with transactions
+# by triggers that run in the same database transaction as each write
+ROLLUP_TABLE = "monthly_rollups"
+
+# Users whose rollups are complete, marked by a rebuild or the first trigger write
+STATUS_TABLE = "rollup_status"
+
+# Postgres function rebuilding a user's rollups from raw rows
+REBUILD_RPC = "rebuild_monthly_rollups"
+
+# Readiness is remembered for this many of the most recently active users
+MAX_CACHED_READY_USERS = 10000
+
+# Users known to have complete rollups; a status row is never removed, so
+# only positive answers are cached
+_ready_users: "OrderedDict[str, None]" = OrderedDict()
+
+
+def month_start(value) -> date:
+    """First day of the month containing a date or ISO date string."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.replace(day=1)
+
+
+def _remember_ready(user_id: str):
+    _ready_users[user_id] = None
+    _ready_users.move_to_end(user_id)
+    if len(_ready_users) > MAX_CACHED_READY_USERS:
+        _ready_users.popitem(last=False)
+
+
+def rollups_ready(user_id: str) -> bool:
+    """Return whether the user's rollups are complete and can answer queries."""
+    if not settings.analytics_use_rollups:
+        return False
+    
+    if user_id in _ready_users:
+        _ready_users.move_to_end(user_id)
+        return True
+    
+    supabase = get_supabase_admin()
+    try:
+        result = supabase.table(STATUS_TABLE).select("user_id").eq("user_id", user_id).execute()
+    except Exception as e:
+        log_warning("Rollup status unavailable, reading raw transactions", {"error": str(e)})
+        return False
+    
+    if result.data:
+        _remember_ready(user_id)
+    return bool(result.data)
+
+
+def get_rollups(user_id: str, start_month: Optional[date] = None, end_month: Optional[date] = None) -> List[Dict]:
+    """
+    Fetch a user's rollup rows for a range of months.
+    
+    Args:
+        user_id: User ID
+        start_month: First month to include (first day of the month)
+        end_month: Last month to include (first day of the month)
+    
+    Returns:
+        Rows with month, category, type, total and count
+    """
+    supabase = get_supabase_admin()
+    rows: List[Dict] = []
+    
+    while True:
+        query = supabase.table(ROLLUP_TABLE).select("month, category, type, total, count").eq("user_id", user_id)
+        if start_month:
+            query = query.gte("month", start_month.isoformat())
+        if end_month:
+            query = query.lte("month", end_month.isoformat())
+        if rows:
+            last = rows[-1]
+            query = query.or_(keyset_filter([("month", last["month"]), ("category", last["category"]), ("type", last["type"])]))
+        
+        page = query.order("month").order("category").order("type").limit(POSTGREST_MAX_ROWS).execute().data
+        rows.extend(page)
+        if len(page) < POSTGREST_MAX_ROWS:
+            return rows
+
+
+def rebuild_rollups(user_id: str) -> Dict:
+    """
+    Recompute a user's rollups from their transactions and mark them ready.
+    
+    Args:
+        user_id: User ID
+    
+    Returns:
+        Dictionary with the number of rollup rows written
+    """
+    supabase = get_supabase_admin()
+    result = supabase.rpc(REBUILD_RPC, {"p_user_id": user_id}).execute()
+    _remember_ready(user_id)
+    
+    log_info("Monthly rollups rebuilt", {"user_id": user_id, "rows": result.data})
+    return {"user_id": user_id, "rollup_rows": result.data, "rebuilt_at": datetime.now().isoformat()}
+
+
+if __name__ == "__main__":
+    # Repair command: python -m src.services.rollups <user_id> [<user_id> ...]
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.services.rollups <user_id> [<user_id> ...]")
+        sys.exit(1)
+    
+    for user_id in sys.argv[1:]:
+        print(rebuild_rollups(user_id))
@@ -0,0 +1,270 @@
+import asyncio
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+from src.services.upload import InvalidUploadFormat, iter_validated_chunks, import_validated_chunks
+from src.utils.logging import *
+
+# Staged uploads are spilled here unless UPLOAD_STAGE_DIR is set
+DEFAULT_STAGING_DIR = Path(tempfile.gettempdir()) / "finsight_staging"
+
+# Columns of a validated chunk, saved in this order after its row count and errors
+STAGED_COLUMNS = ("row_number", "date", "description", "amount", "type")
+
+# In-process registry of staged uploads, keyed by stage id
+_stages: Dict[str, Dict] = {}
+
+
+def _staging_dir() -> Path:
+    """
+    Get the staging directory, creating it private to this user.
+    
+    Raises:
+        PermissionError: If the directory exists but belongs to another user
+    """
+    path = Path(settings.upload_stage_dir) if settings.upload_stage_dir else DEFAULT_STAGING_DIR
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # chmod fails unless this process owns the directory, so one planted by
+    # another user in a shared temp dir is never written to
+    path.chmod(0o700)
+    return path
+
+
+def sweep_staged_uploads():
+    """
+    Delete spill files left behind by a previous process.
+    
+    Stages live in the registry of the process that created them, so spill
+    files older than the stage TTL can no longer be committed by anyone.
+    """
+    try:
+        path = _staging_dir()
+    except OSError as e:
+        log_error("Upload staging directory is not usable", error=e, context={"path": settings.upload_stage_dir or str(DEFAULT_STAGING_DIR)})
+        return
+    
+    cutoff = time.time() - settings.upload_stage_ttl_minutes * 60
+    swept = 0
+    for spill in path.glob("*.npy"):
+        try:
+            if spill.stat().st_mtime < cutoff:
+                spill.unlink()
+                swept += 1
+        except OSError as e:
+            log_warning("Could not remove orphaned upload stage", {"path": str(spill), "error": str(e)})
+    
+    if swept:
+        log_info("Swept orphaned upload stages", {"count": swept})
+
+
+def _evict_expired_stages():
+    """Delete staged uploads whose TTL has passed."""
+    now = datetime.now()
+    expired = [stage_id for stage_id, stage in _stages.items() if stage["expires_at"] <= now]
+    for stage_id in expired:
+        _drop_stage(stage_id)
+    
+    if expired:
+        log_debug("Evicted expired upload stages", {"count": len(expired)})
+
+
+def _drop_stage(stage_id: str):
+    """Remove a stage from the registry and delete its spill file."""
+    stage = _stages.pop(stage_id, None)
+    if stage:
+        stage["path"].unlink(missing_ok=True)
+
+
+def _spill_chunks(file_content: BinaryIO, file_extension: str, path: Path) -> Dict:
+    """
+    Parse and validate an upload once, writing each clean chunk to a spill file.
+    
+    Each chunk is saved as plain arrays (its row count, its errors, then one
+    array per column), so reading a spill file never unpickles anything.
+    
+    Returns:
+        Dictionary with row counts and validation errors
+    """
+    total_rows = 0
+    valid_rows = 0
+    errors: List[str] = []
+    
+    with open(path, "xb") as spill:
+        for row_count, clean, row_errors in iter_validated_chunks(file_content, file_extension):
+            np.save(spill, np.array([row_count]), allow_pickle=False)
+            np.save(spill, np.array(row_errors, dtype=str), allow_pickle=False)
+            for column in STAGED_COLUMNS:
+                values = clean[column].to_numpy()
+                np.save(spill, values.astype(str) if values.dtype == object else values, allow_pickle=False)
+            total_rows += row_count
+            valid_rows += len(clean)
+            errors.extend(row_errors)
+    
+    return {"total_rows": total_rows, "valid_rows": valid_rows, "errors": errors}
+
+
+def _load_chunks(path: Path) -> Iterator[Tuple[int, pd.DataFrame, List[str]]]:
+    """Read staged chunks back from a spill file, one at a time."""
+    with open(path, "rb") as spill:
+        while True:
+            try:
+                row_count = int(np.load(spill, allow_pickle=False)[0])
+            except EOFError:
+                return
+            row_errors = np.load(spill, allow_pickle=False).tolist()
+            clean = pd.DataFrame({
+                column: np.load(spill, allow_pickle=False) for column in STAGED_COLUMNS
+            })
+            for column in ("date", "description", "type"):
+                clean[column] = clean[column].astype(object)
+            yield row_count, clean, row_errors
+
+
+def _preview_page(path: Path, offset: int, limit: int) -> List[Dict]:
+    """Return a page of staged rows without loading the whole stage."""
+    rows: List[Dict] = []
+    skipped = 0
+    
+    for _, clean, _ in _load_chunks(path):
+        if skipped + len(clean) <= offset:
+            skipped += len(clean)
+            continue
+        
+        page = clean.iloc[max(0, offset - skipped):][:limit - len(rows)]
+        rows.extend(page.to_dict("records"))
+        skipped += len(clean)
+        
+        if len(rows) >= limit:
+            break
+    
+    return rows
+
+
+def _stage_response(stage_id: str, stage: Dict, offset: int, limit: int) -> Dict:
+    """Build the preview response for a stage."""
+    return {
+        "message": "Upload staged",
+        "stage_id": stage_id,
+        "filename": stage["filename"],
+        "total_rows": stage["total_rows"],
+        "valid_rows": stage["valid_rows"],
+        "failed_rows": len(stage["errors"]),
+        "errors": stage["errors"][:10],  # Return first 10 errors
+        "expires_at": stage["expires_at"],
+        "offset": offset,
+        "rows": _preview_page(stage["path"], offset, limit),
+    }
+
+
+async def stage_upload(user_id: str, file_content: BinaryIO, filename: str, file_extension: str) -> Dict:
+    """
+    Parse and validate an upload, and stage the clean rows for a later commit.
+    
+    Args:
+        user_id: User ID
+        file_content: Binary file object positioned at the start of the upload
+        filename: Original file name
+        file_extension: File extension (.csv or .xlsx)
+    
+    Returns:
+        Preview with the first page of staged rows and a validation summary
+    """
+    _evict_expired_stages()
+    
+    stage_id = str(uuid.uuid4())
+    path = _staging_dir() / f"{stage_id}.npy"
+    
+    try:
+        summary = await asyncio.to_thread(_spill_chunks, file_content, file_extension, path)
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        if not isinstance(e, InvalidUploadFormat):
+            log_error("Failed to stage upload", error=e, context={"user_id": user_id, "filename": filename})
+        return {
+            "message": "Invalid CSV format" if isinstance(e, InvalidUploadFormat) else "Failed to parse CSV",
+            "stage_id": None,
+            "filename": filename,
+            "total_rows": 0,
+            "valid_rows": 0,
+            "failed_rows": 0,
+            "errors": [str(e)]
+        }
+    
+    ttl = timedelta(minutes=settings.upload_stage_ttl_minutes)
+    _stages[stage_id] = {
+        "user_id": user_id,
+        "filename": filename,
+        "path": path,
+        "expires_at": datetime.now() + ttl,
+        **summary,
+    }
+    
+    # Evict the stage automatically if it is never committed or discarded
+    asyncio.get_running_loop().call_later(ttl.total_seconds(), _evict_expired_stages)
+    
+    log_info("Upload staged", {"user_id": user_id, "stage_id": stage_id, "total_rows": summary["total_rows"]})
+    return _stage_response(stage_id, _stages[stage_id], 0, settings.upload_preview_rows)
+
+
+async def get_staged_upload(user_id: str, stage_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Dict]:
+    """Get a page of a staged upload's preview."""
+    _evict_expired_stages()
+    
+    stage = _stages.get(stage_id)
+    if not stage or stage["user_id"] != user_id:
+        return None
+    
+    page_size = limit or settings.upload_preview_rows
+    return await asyncio.to_thread(_stage_response, stage_id, stage, max(0, offset), page_size)
+
+
+async def commit_staged_upload(user_id: str, stage_id: str) -> Optional[Dict]:
+    """
+    Import a staged upload without re-reading or re-parsing the original file.
+    
+    Returns:
+        Dictionary with import results, or None if the stage does not exist
+    """
+    _evict_expired_stages()
+    
+    stage = _stages.get(stage_id)
+    if not stage or stage["user_id"] != user_id:
+        return None
+    
+    # Take the stage out of the registry so it cannot be committed twice
+    del _stages[stage_id]
+    
+    try:
+        result = await import_validated_chunks(_load_chunks(stage["path"]), user_id)
+        log_info("Staged upload committed", {"user_id": user_id, "stage_id": stage_id, "imported": result["successful_imports"]})
+        return result
+    except Exception as e:
+        log_error("Failed to commit staged upload", error=e, context={"user_id": user_id, "stage_id": stage_id})
+        return {
+            "message": "Failed to import staged upload",
+            "total_rows": stage["total_rows"],
+            "successful_imports": 0,
+            "failed_imports": 0,
+            "duplicate_rows": 0,
+            "errors": [str(e)]
+        }
+    finally:
+        stage["path"].unlink(missing_ok=True)
+
+
+async def discard_staged_upload(user_id: str, stage_id: str) -> bool:
+    """Discard a staged upload."""
+    stage = _stages.get(stage_id)
+    if not stage or stage["user_id"] != user_id:
+        return False
+    
+    _drop_stage(stage_id)
+    return True
@@ -1,9 +1,60 @@
-from typing import List, Optional, Dict
+import base64
+import uuid
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from src.database import get_supabase_admin
+from src.config import settings
+from src.database import POSTGREST_MAX_ROWS, get_supabase_admin, keyset_filter
+from src.services.category_cache import record_category_correction
+from src.services.category_model import learn_category
+from src.utils.merchant import canonicalize_merchant
+from src.utils.prompt import CATEGORIES
 from src.utils.schema import TransactionCreate, TransactionFilter
 
 
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def _sort_value(field: str, value) -> str:
+    """Normalize a sort key value so it round-trips through a cursor."""
+    if field == "date":
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    if field == "amount":
+        return repr(float(value))
+    return str(value)
+
+
+def encode_cursor(transaction: Dict, sort: str = "date") -> str:
+    """Opaque cursor for the (sort key, id) position of a transaction."""
+    raw = f"{sort}|{_sort_value(sort, transaction[sort])}|{transaction['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str = "date") -> Tuple[str, str]:
+    """
+    Decode a cursor from encode_cursor.
+    
+    Both parts are re-validated, and the cursor must come from a listing
+    sorted the same way.
+    
+    Returns:
+        Tuple of (sort key value, transaction id)
+    
+    Raises:
+        InvalidCursor: If the cursor is malformed or for another sort
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        field, rest = raw.split("|", 1)
+        value, transaction_id = rest.rsplit("|", 1)
+        if field != sort:
+            raise ValueError(f"Cursor is for sort '{field}'")
+        return _sort_value(field, value), str(uuid.UUID(transaction_id))
+    except ValueError as e:
+        raise InvalidCursor("Invalid pagination cursor") from e
+
+
 async def create_transaction(user_id: str, transaction: TransactionCreate) -> Dict:
     """
     Create a new transaction for a user.
@@ -11,7 +62,7 @@ async def create_transaction(user_id: str, transaction: TransactionCreate) -> Di
     Args:
         user_id: The user's ID
         transaction: Transaction data
-        
+    
     Returns:
         The created transaction
     """
@@ -21,6 +72,7 @@ async def create_transaction(user_id: str, transaction: TransactionCreate) -> Di
         "user_id": user_id,
         "date": transaction.date.isoformat(),
         "description": transaction.description,
+        "merchant": canonicalize_merchant(transaction.description),
         "amount": float(transaction.amount),
         "category": transaction.category or "Uncategorized",
         "type": transaction.type,
@@ -28,24 +80,46 @@ async def create_transaction(user_id: str, transaction: TransactionCreate) -> Di
     }
     
     result = supabase.table("transactions").insert(transaction_data).execute()
+    
+    # A category chosen by the user is a confirmed label for their model
+    if result.data and transaction.category in CATEGORIES:
+        await learn_category(user_id, transaction.description, transaction.category)
+    
     return result.data[0] if result.data else None
 
 
 async def get_transactions(
     user_id: str,
-    filters: Optional[TransactionFilter] = None
-) -> List[Dict]:
+    filters: Optional[TransactionFilter] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "date",
+    descending: bool = True
+) -> Dict:
     """
-    Retrieve transactions for a user with optional filters.
+    Retrieve a page of transactions for a user with optional filters.
+    
+    Pages are ordered by (sort, id), newest first by default, and continue
+    strictly after the cursor, so rows inserted meanwhile never shift or
+    repeat a page and sorting covers every row, not just the loaded ones.
     
     Args:
         user_id: The user's ID
         filters: Optional filters for transactions
-        
+        limit: Page size, capped at TRANSACTIONS_MAX_PAGE_SIZE
+        cursor: next_cursor from the previous page
+        sort: Column to sort by: 'date', 'amount' or 'category'
+        descending: Sort direction
+    
     Returns:
-        List of transactions
+        Dictionary with the page's transactions and the next_cursor, which
+        is None on the last page
+    
+    Raises:
+        InvalidCursor: If the cursor is malformed
     """
     supabase = get_supabase_admin()
+    page_size = min(max(1, limit or settings.transactions_page_size), settings.transactions_max_page_size)
     
     query = supabase.table("transactions").select("*").eq("user_id", user_id)
     
@@ -63,8 +137,74 @@ async def get_transactions(
         if filters.max_amount is not None:
             query = query.lte("amount", filters.max_amount)
     
-    result = query.order("date", desc=True).execute()
-    return result.data
+    if cursor:
+        value, transaction_id = decode_cursor(cursor, sort)
+        query = query.or_(keyset_filter([(sort, value), ("id", transaction_id)], "lt" if descending else "gt"))
+    
+    # One extra row tells whether another page follows
+    rows = query.order(sort, desc=descending).order("id", desc=descending).limit(page_size + 1).execute().data
+    
+    return {
+        "transactions": rows[:page_size],
+        "next_cursor": encode_cursor(rows[page_size - 1], sort) if len(rows) > page_size else None
+    }
+
+
+def iter_transaction_pages(
+    user_id: str,
+    columns: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    transaction_type: Optional[str] = None,
+    page_size: int = POSTGREST_MAX_ROWS,
+    source: Optional[str] = None,
+    category: Optional[str] = None
+) -> Iterator[List[Dict]]:
+    """
+    Stream a user's transactions oldest first in fixed-size pages.
+    
+    Each page continues after the last (date, id) seen, so every request is
+    an index range scan, however deep into the history it is. `page_size`
+    must not exceed PostgREST's max-rows, or a capped page would look like
+    the last one.
+    
+    Args:
+        user_id: User ID
+        columns: Columns to select; must include id and date
+        start_date: Optional first date
+        end_date: Optional last date
+        transaction_type: Optional 'income' or 'expense' filter
+        page_size: Rows per request
+        source: Optional source filter, e.g. 'manual'
+        category: Optional category filter
+    
+    Yields:
+        Lists of up to page_size rows
+    """
+    supabase = get_supabase_admin()
+    after = None
+    
+    while True:
+        query = supabase.table("transactions").select(columns).eq("user_id", user_id)
+        if start_date:
+            query = query.gte("date", start_date.isoformat())
+        if end_date:
+            query = query.lte("date", end_date.isoformat())
+        if transaction_type:
+            query = query.eq("type", transaction_type)
+        if source:
+            query = query.eq("source", source)
+        if category:
+            query = query.eq("category", category)
+        if after:
+            query = query.or_(keyset_filter(after))
+        
+        page = query.order("date").order("id").limit(page_size).execute().data
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = [("date", str(page[-1]["date"])[:10]), ("id", page[-1]["id"])]
 
 
 async def get_transaction_by_id(user_id: str, transaction_id: str) -> Optional[Dict]:
@@ -80,9 +220,21 @@ async def update_transaction(user_id: str, transaction_id: str, updates: Dict) -
     """Update a transaction."""
     supabase = get_supabase_admin()
     
+    if "description" in updates:
+        updates = {**updates, "merchant": canonicalize_merchant(updates["description"])}
+    
     result = supabase.table("transactions").update(updates).eq("id", transaction_id).eq("user_id", user_id).execute()
     
-    return result.data[0] if result.data else None
+    if not result.data:
+        return None
+    
+    # A manual category change is a correction; remember it for this merchant
+    updated = result.data[0]
+    if updates.get("category") in CATEGORIES:
+        await record_category_correction(user_id, updated["description"], updated["category"])
+        await learn_category(user_id, updated["description"], updated["category"])
+    
+    return updated
 
 
 async def delete_transaction(user_id: str, transaction_id: str) -> bool:
@@ -1,102 +1,494 @@
+import asyncio
+import hashlib
+import itertools
+import warnings
+import numpy as np
 import pandas as pd
-from io import StringIO
+from datetime import date
+from io import BytesIO, StringIO
+from openpyxl import load_workbook
 from pathlib import Path
-from typing import Dict
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
+from src.config import settings
 from src.database import get_supabase_admin
-from src.services.categorization import categorize_transaction
+from src.services.categorization import categorize_transactions
+from src.services.transactions import iter_transaction_pages
+from src.utils.logging import *
+from src.utils.merchant import canonicalize_merchant
+from src.utils.schema import ImportProgress
 
+REQUIRED_COLUMNS = ['date', 'description', 'amount']
+TRANSACTION_TYPES = ("income", "expense")
 
-async def parse_csv_file(file_content: str, user_id: str, file_extension: str = '.csv') -> Dict:
+
+class InvalidUploadFormat(ValueError):
+    """Raised when an uploaded file is missing required columns."""
+
+
+def _insert_rows(supabase, rows: List[Tuple[int, Dict]]) -> Tuple[int, List[str]]:
     """
-    Parse CSV or Excel file and import transactions.
+    Insert rows in a single multi-row request, isolating failures.
     
-    Expected format:
-    date, description, amount, type (optional)
+    If the batch is rejected, it is split in half and each half is retried,
+    so a single bad row only costs a handful of extra requests and never
+    takes the rest of its batch down with it.
+    
+    Args:
+        supabase: Supabase client
+        rows: List of (row number, transaction data) tuples
+    
+    Returns:
+        Tuple of (number of inserted rows, list of row errors)
+    """
+    if not rows:
+        return 0, []
+    
+    try:
+        supabase.table("transactions").insert([data for _, data in rows]).execute()
+        return len(rows), []
+    except Exception as e:
+        if len(rows) == 1:
+            return 0, [f"Row {rows[0][0]}: {str(e)}"]
+    
+    middle = len(rows) // 2
+    left_inserted, left_errors = _insert_rows(supabase, rows[:middle])
+    right_inserted, right_errors = _insert_rows(supabase, rows[middle:])
+    return left_inserted + right_inserted, left_errors + right_errors
+
+
+def _read_excel_chunks(source: BinaryIO) -> Iterator[pd.DataFrame]:
+    """
+    Stream the first worksheet of an .xlsx file as DataFrame chunks.
+    
+    The workbook is opened in openpyxl's read-only, values-only mode, which
+    iterates rows straight from the XML instead of building the whole
+    workbook in memory. Blank rows are skipped, and each chunk is indexed so
+    that index + 2 is the row's number in the sheet, as with CSV chunks.
+    
+    Args:
+        source: Binary file object with the workbook
+    
+    Yields:
+        DataFrame chunks of at most settings.upload_parse_chunk_rows rows
+    """
+    chunk_rows = max(1, settings.upload_parse_chunk_rows)
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        
+        columns = [str(name).strip() if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        width = len(columns)
+        
+        values: List[tuple] = []
+        index: List[int] = []
+        chunks_yielded = 0
+        for sheet_row, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            
+            values.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            index.append(sheet_row - 2)
+            
+            if len(values) >= chunk_rows:
+                yield pd.DataFrame(values, columns=columns, index=index)
+                chunks_yielded += 1
+                values, index = [], []
+        
+        # Always yield at least one chunk so the header is still validated
+        if values or not chunks_yielded:
+            yield pd.DataFrame(values, columns=columns, index=index)
+    finally:
+        workbook.close()
+
+
+def _read_chunks(file_content: Union[str, bytes, BinaryIO], file_extension: str) -> Iterator[pd.DataFrame]:
+    """
+    Read an uploaded file as a sequence of DataFrame chunks.
+    
+    CSV files are parsed incrementally so only one chunk of rows is held in
+    memory at a time. Chunk indexes continue across chunks, so the original
+    row numbers can still be reported in errors.
+    
+    Args:
+        file_content: File content as string, bytes or a binary file object
+        file_extension: File extension (.csv or .xlsx)
+    
+    Yields:
+        DataFrame chunks of at most settings.upload_parse_chunk_rows rows
+    """
+    if isinstance(file_content, str):
+        source = StringIO(file_content)
+    elif isinstance(file_content, bytes):
+        source = BytesIO(file_content)
+    else:
+        source = file_content
+    
+    if file_extension == '.xlsx':
+        yield from _read_excel_chunks(source)
+        return
+    
+    chunk_rows = max(1, settings.upload_parse_chunk_rows)
+    with pd.read_csv(source, chunksize=chunk_rows, encoding='utf-8') as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _parse_dates(column: pd.Series) -> pd.Series:
+    """
+    Parse a date column, falling back to per-value parsing only where needed.
+    
+    The fast path infers a single format for the whole column; values it
+    cannot handle (e.g. a file mixing date formats) are re-parsed with
+    format='mixed'. Unparseable values become NaT.
+    """
+    with warnings.catch_warnings():
+        # Mixed-type columns (common in spreadsheets) are handled by the retry below
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(column, errors='coerce')
+    retry = parsed.isna() & column.notna()
+    if retry.any():
+        parsed = parsed.astype(object)
+        parsed[retry] = pd.to_datetime(column[retry].astype(str), errors='coerce', format='mixed')
+        parsed = pd.to_datetime(parsed, errors='coerce')
+    return parsed
+
+
+def _validate_chunk(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Validate and normalize a chunk of uploaded rows column-wise.
+    
+    Dates and amounts are coerced over whole columns, the transaction type
+    is taken from the optional 'type' column or inferred from the sign of the
+    amount, and invalid rows are collected through boolean masks.
+    
+    Args:
+        df: Raw chunk with at least date, description and amount columns
+    
+    Returns:
+        Tuple of (clean DataFrame, list of row errors). The clean frame has
+        row_number, date (ISO string), description, amount (positive) and
+        type columns, ready for categorization and bulk insert.
+    """
+    row_numbers = df.index.to_series() + 2  # header row + 1-based numbering
+    
+    dates = _parse_dates(df['date'])
+    amounts = pd.to_numeric(df['amount'], errors='coerce')
+    descriptions = df['description'].astype('string').str.strip()
+    
+    inferred_types = pd.Series(
+        np.where(amounts < 0, 'expense', 'income'),
+        index=df.index
+    )
+    if 'type' in df.columns:
+        types = df['type'].astype('string').str.strip().str.lower()
+        types = types.fillna(inferred_types)
+    else:
+        types = inferred_types
+    
+    checks = [
+        (dates.isna(), "Invalid date", df['date']),
+        (amounts.isna(), "Invalid amount", df['amount']),
+        (descriptions.isna() | (descriptions == ""), "Missing description", None),
+        (~types.isin(TRANSACTION_TYPES), "Invalid type", df['type'] if 'type' in df.columns else None),
+    ]
+    
+    invalid = pd.Series(False, index=df.index)
+    errors = []
+    for mask, message, values in checks:
+        # Report only the first problem found for each row
+        mask = mask.fillna(True) & ~invalid
+        for index in df.index[mask]:
+            detail = f" '{values[index]}'" if values is not None else ""
+            errors.append((row_numbers[index], f"Row {row_numbers[index]}: {message}{detail}"))
+        invalid |= mask
+    
+    valid = ~invalid
+    clean = pd.DataFrame({
+        "row_number": row_numbers[valid],
+        "date": dates[valid].dt.strftime('%Y-%m-%d'),
+        "description": descriptions[valid].astype(object),
+        "amount": amounts[valid].abs().astype(float),
+        "type": types[valid].astype(object),
+    })
+    
+    errors.sort(key=lambda item: item[0])
+    return clean, [message for _, message in errors]
+
+
+def _fingerprint_chunk(clean: pd.DataFrame, seen_counts: Dict[str, int]) -> pd.Series:
+    """
+    Compute import fingerprints for a chunk of validated rows.
+    
+    The fingerprint hashes the normalized (date, description, amount, type)
+    together with the occurrence number of that key within the file, so two
+    identical coffees on the same day stay distinct while re-uploading the
+    same statement reproduces the same fingerprints.
+    
+    Args:
+        clean: Validated chunk from _validate_chunk
+        seen_counts: Occurrences of each key in earlier chunks; updated in place
+    
+    Returns:
+        Series of hex fingerprints aligned with the chunk index
+    """
+    keys = (
+        clean["date"]
+        + "|" + clean["description"].str.lower().str.split().str.join(" ")
+        + "|" + clean["amount"].map("{:.2f}".format)
+        + "|" + clean["type"]
+    )
+    occurrences = keys.groupby(keys).cumcount() + keys.map(seen_counts).fillna(0).astype(int)
+    
+    for key, count in keys.value_counts().items():
+        seen_counts[key] = seen_counts.get(key, 0) + count
+    
+    return pd.Series(
+        [hashlib.sha1(f"{key}|{n}".encode()).hexdigest() for key, n in zip(keys, occurrences)],
+        index=clean.index
+    )
+
+
+def _existing_fingerprints(user_id: str, start_date: str, end_date: str) -> Set[str]:
+    """
+    Fetch the user's stored fingerprints for a date window in one paged scan.
     
     Args:
-        file_content: File content as string (for CSV) or bytes (for Excel)
         user_id: User ID
+        start_date: First date of the window (ISO format)
+        end_date: Last date of the window (ISO format)
+    
+    Returns:
+        Set of fingerprints already imported in the window
+    """
+    pages = iter_transaction_pages(
+        user_id, "id, date, fingerprint", date.fromisoformat(start_date), date.fromisoformat(end_date)
+    )
+    return {row["fingerprint"] for page in pages for row in page if row["fingerprint"]}
+
+
+def iter_validated_chunks(
+    file_content: Union[str, bytes, BinaryIO],
+    file_extension: str = '.csv'
+) -> Iterator[Tuple[int, pd.DataFrame, List[str]]]:
+    """
+    Read and validate an upload chunk by chunk.
+    
+    The header is checked once, before any rows are validated; a file with
+    no header at all (empty, or an empty worksheet) is missing every
+    required column rather than an empty import.
+    
+    Args:
+        file_content: File content as string or bytes, or a binary file object
         file_extension: File extension (.csv or .xlsx)
-        
+    
+    Yields:
+        Tuples of (number of rows read, clean DataFrame, row errors)
+    
+    Raises:
+        InvalidUploadFormat: If required columns are missing
+    """
+    chunks = _read_chunks(file_content, file_extension)
+    try:
+        first = next(chunks, None)
+    except pd.errors.EmptyDataError:
+        first = None
+    
+    # Validate required columns
+    columns = first.columns if first is not None else []
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise InvalidUploadFormat(f"Missing required columns: {', '.join(missing_columns)}")
+    
+    for df in itertools.chain([first], chunks):
+        # Validate the whole chunk column-wise
+        clean, row_errors = _validate_chunk(df)
+        yield len(df), clean, row_errors
+
+
+async def import_validated_chunks(
+    chunks: Iterable[Tuple[int, pd.DataFrame, List[str]]],
+    user_id: str,
+    progress: Optional[ImportProgress] = None
+) -> Dict:
+    """
+    Deduplicate, categorize and bulk insert validated chunks.
+    
+    If reading or importing fails after some rows were inserted, the rows
+    already queued are still inserted and the partial counts are returned
+    with the error, since the earlier batches stay committed.
+    
+    Args:
+        chunks: Tuples of (number of rows read, clean DataFrame, row errors),
+            as produced by iter_validated_chunks
+        user_id: User ID
+        progress: Optional progress counters, updated as rows move through
+            parsing, categorization and insertion
+    
     Returns:
         Dictionary with import results
+    
+    Raises:
+        Exception: Whatever stopped the import, if nothing was inserted
     """
+    if progress is None:
+        progress = ImportProgress()
+    
     errors = []
+    total_rows = 0
     successful_imports = 0
     failed_imports = 0
+    duplicate_rows = 0
+    
+    supabase = get_supabase_admin()
+    batch_size = max(1, settings.upload_insert_batch_size)
+    pending: List[Tuple[int, Dict]] = []
+    seen_counts: Dict[str, int] = {}
+    categorization_stats: Dict[str, int] = {}
     
+    # A read or parse error partway through must not hide rows already inserted
+    stopped: Optional[Exception] = None
     try:
-        # Read file based on extension
-        if file_extension == '.xlsx':
-            from io import BytesIO
-            df = pd.read_excel(BytesIO(file_content))
-        else:
-            df = pd.read_csv(StringIO(file_content))
-        
-        # Validate required columns
-        required_columns = ['date', 'description', 'amount']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            return {
-                "message": "Invalid CSV format",
-                "total_rows": 0,
-                "successful_imports": 0,
-                "failed_imports": 0,
-                "errors": [f"Missing required columns: {', '.join(missing_columns)}"]
-            }
-        
-        supabase = get_supabase_admin()
-        
-        # Process each row
-        for index, row in df.iterrows():
-            try:
-                # Parse date
-                transaction_date = pd.to_datetime(row['date']).date()
-                
-                # Determine transaction type
-                amount = float(row['amount'])
-                transaction_type = row.get('type', 'expense' if amount < 0 else 'income').lower()
+        chunks = iter(chunks)
+        while True:
+            # Reading and validating a chunk is CPU-bound pandas work, so it
+            # runs in a worker thread instead of stalling the event loop
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            
+            row_count, clean, row_errors = chunk
+            total_rows += row_count
+            failed_imports += len(row_errors)
+            errors.extend(row_errors)
+            progress.rows_parsed = total_rows
+            progress.rows_failed = failed_imports
+            
+            # Skip rows that were already imported, with one lookup per chunk
+            if not clean.empty:
+                clean = clean.copy()
+                clean["fingerprint"] = _fingerprint_chunk(clean, seen_counts)
+                existing = await asyncio.to_thread(
+                    _existing_fingerprints, user_id, clean["date"].min(), clean["date"].max()
+                )
+                duplicates = clean["fingerprint"].isin(existing)
+                duplicate_rows += int(duplicates.sum())
+                progress.rows_duplicate = duplicate_rows
+                clean = clean[~duplicates]
+            
+            for start in range(0, len(clean), batch_size):
+                part = clean.iloc[start:start + batch_size]
                 
-                # Make amount positive if it's negative
-                amount = abs(amount)
+                # Categorize the slice with batched prompts
+                categories = await categorize_transactions([
+                    {"id": row.row_number, "description": row.description, "amount": row.amount}
+                    for row in part.itertuples(index=False)
+                ], user_id, categorization_stats)
+                progress.rows_categorized += len(part)
                 
-                # Categorize transaction
-                category = await categorize_transaction(row['description'], amount)
+                # Canonicalize each distinct description once
+                merchants = {description: canonicalize_merchant(description) for description in part["description"].unique()}
                 
-                # Insert into database
-                transaction_data = {
-                    "user_id": user_id,
-                    "date": transaction_date.isoformat(),
-                    "description": str(row['description']),
-                    "amount": amount,
-                    "category": category,
-                    "type": transaction_type,
-                    "source": "csv_upload"
-                }
+                # Queue for the next bulk insert
+                for row in part.itertuples(index=False):
+                    pending.append((row.row_number, {
+                        "user_id": user_id,
+                        "date": row.date,
+                        "description": row.description,
+                        "merchant": merchants[row.description],
+                        "amount": row.amount,
+                        "category": categories[str(row.row_number)],
+                        "type": row.type,
+                        "source": "csv_upload",
+                        "fingerprint": row.fingerprint
+                    }))
                 
-                supabase.table("transactions").insert(transaction_data).execute()
-                successful_imports += 1
-                
-            except Exception as e:
-                failed_imports += 1
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
+                if len(pending) >= batch_size:
+                    inserted, batch_errors = await asyncio.to_thread(_insert_rows, supabase, pending)
+                    successful_imports += inserted
+                    failed_imports += len(batch_errors)
+                    errors.extend(batch_errors)
+                    progress.rows_inserted = successful_imports
+                    progress.rows_failed = failed_imports
+                    pending = []
+    
+    except Exception as e:
+        if not successful_imports and not pending:
+            raise
+        log_error("Import stopped partway", error=e, context={"user_id": user_id, "rows_read": total_rows})
+        stopped = e
+    
+    # Flush the final partial batch
+    inserted, batch_errors = await asyncio.to_thread(_insert_rows, supabase, pending)
+    successful_imports += inserted
+    failed_imports += len(batch_errors)
+    errors.extend(batch_errors)
+    progress.rows_inserted = successful_imports
+    progress.rows_failed = failed_imports
+    
+    log_info("Import categorization summary", {"user_id": user_id, **categorization_stats})
+    
+    if stopped:
+        errors.insert(0, f"Import stopped after {total_rows} rows: {stopped}")
+    
+    return {
+        "message": "CSV import incomplete" if stopped else "CSV import completed",
+        "total_rows": total_rows,
+        "successful_imports": successful_imports,
+        "failed_imports": failed_imports,
+        "duplicate_rows": duplicate_rows,
+        "errors": errors[:10]  # Return first 10 errors
+    }
+
+
+async def parse_csv_file(
+    file_content: Union[str, bytes, BinaryIO],
+    user_id: str,
+    file_extension: str = '.csv',
+    progress: Optional[ImportProgress] = None
+) -> Dict:
+    """
+    Parse CSV or Excel file and import transactions.
+    
+    Expected format:
+    date, description, amount, type (optional)
+    
+    Args:
+        file_content: File content as string or bytes, or a binary file object
+            positioned at the start of the upload
+        user_id: User ID
+        file_extension: File extension (.csv or .xlsx)
+        progress: Optional progress counters, updated as rows move through
+            parsing, categorization and insertion
+    
+    Returns:
+        Dictionary with import results
+    """
+    try:
+        chunks = iter_validated_chunks(file_content, file_extension)
+        return await import_validated_chunks(chunks, user_id, progress)
+    
+    except InvalidUploadFormat as e:
         return {
-            "message": "CSV import completed",
-            "total_rows": len(df),
-            "successful_imports": successful_imports,
-            "failed_imports": failed_imports,
-            "errors": errors[:10]  # Return first 10 errors
+            "message": "Invalid CSV format",
+            "total_rows": 0,
+            "successful_imports": 0,
+            "failed_imports": 0,
+            "duplicate_rows": 0,
+            "errors": [str(e)]
         }
-        
+    
     except Exception as e:
         return {
             "message": "Failed to parse CSV",
             "total_rows": 0,
             "successful_imports": 0,
             "failed_imports": 0,
+            "duplicate_rows": 0,
             "errors": [str(e)]
         }
 
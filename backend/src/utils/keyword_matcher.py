@@ -0,0 +1,96 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton mapping keywords to categories.
+    
+    All keywords are matched in a single pass over the text. Only matches on
+    word boundaries count, so "gas" matches "Shell Gas 123" but not "Vegas".
+    When several keywords match, the highest priority wins, then the longest
+    keyword.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str, int]]):
+        """
+        Build the automaton.
+        
+        Args:
+            rules: (keyword, category, priority) tuples; keywords are matched
+                case-insensitively
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (keyword length, priority, category) for every keyword ending there
+        self._output: List[List[Tuple[int, int, str]]] = [[]]
+        self.size = 0
+        
+        for keyword, category, priority in rules:
+            keyword = " ".join(str(keyword).lower().split())
+            if keyword:
+                self._add(keyword, category, priority)
+                self.size += 1
+        
+        self._build_failure_links()
+
+    def _add(self, keyword: str, category: str, priority: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        
+        # A later rule for the same keyword replaces the earlier one
+        self._output[state] = [(len(keyword), priority, category)]
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def match(self, text: str, min_priority: Optional[int] = None) -> Optional[str]:
+        """
+        Return the category of the best keyword found in the text, if any.
+        
+        Args:
+            text: Transaction description
+            min_priority: Ignore keywords with a lower priority than this
+        
+        Returns:
+            Category name, or None if no keyword matches
+        """
+        text = " ".join(str(text).lower().split())
+        best: Optional[Tuple[int, int, str]] = None
+        state = 0
+        
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            
+            for length, priority, category in self._output[state]:
+                if min_priority is not None and priority < min_priority:
+                    continue
+                start = end - length + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end + 1 < len(text) and text[end + 1].isalnum():
+                    continue
+                if best is None or (priority, length) > (best[1], best[0]):
+                    best = (length, priority, category)
+        
+        return best[2] if best else None
@@ -0,0 +1,177 @@
+import json
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from src.config import settings
+from src.utils.keyword_matcher import KeywordMatcher
+from src.utils.prompt import CATEGORY_KEYWORDS
+
+
+class LLMResponse:
+    """Minimal response object exposing `.text`, like the Gemini SDK response."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class LLMBackend(ABC):
+    """A text generation provider. Calls are synchronous and run in worker threads."""
+    
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str, timeout: float):
+        """Return the complete response; its `text` attribute holds the text."""
+
+    @abstractmethod
+    def generate_stream(self, prompt: str, timeout: float) -> Iterator[str]:
+        """Yield the generated text in pieces as the provider produces it."""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini, with the SDK configured and the model built once."""
+    
+    name = "gemini"
+
+    def __init__(self):
+        genai.configure(api_key=settings.gemini_api_key)
+        self.model = genai.GenerativeModel(settings.gemini_model)
+
+    def generate(self, prompt: str, timeout: float):
+        return self.model.generate_content(prompt, request_options={"timeout": timeout})
+
+    def generate_stream(self, prompt: str, timeout: float) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            if chunk.text:
+                yield chunk.text
+
+
+class OfflineBackend(LLMBackend):
+    """
+    Deterministic local stand-in for load testing without network or quota.
+    
+    Answers categorization prompts with the built-in keyword rules and
+    insight prompts with a template filled from the prompt's own figures.
+    Every call sleeps for `latency_ms`, and a seeded random generator makes
+    a fraction `error_rate` of calls raise a retryable ServiceUnavailable.
+    Streamed answers are split into `STREAM_CHUNK_CHARS` pieces, with the
+    latency spread across them.
+    """
+    
+    name = "offline"
+    STREAM_CHUNK_CHARS = 40
+    
+    _BATCH_ITEM = re.compile(r'^\s*(\{"id":.*\})\s*$', re.MULTILINE)
+    _SINGLE_DESCRIPTION = re.compile(r"Transaction description: (.*)")
+    _MONEY_FIELD = r"- {}: \$([\d,.\-]+)"
+    _TOP_CATEGORY = re.compile(r"Top Spending Categories:\s*- ([^:\n]+): \$([\d,.]+) \(([^)]*)\)")
+    _EXPENSE_CHANGE = re.compile(r"Expense Change: ([\d.\-]+%) \((\w+)\)")
+    _ANOMALIES = re.compile(r"Anomalies Detected: (\d+)")
+
+    def __init__(self, latency_ms: int, error_rate: float, seed: int):
+        self.latency = max(0, latency_ms) / 1000
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._matcher = KeywordMatcher(
+            (keyword, category, 0)
+            for category, keywords in CATEGORY_KEYWORDS.items()
+            for keyword in keywords
+        )
+
+    def _categorize(self, description: str) -> str:
+        return self._matcher.match(description) or "Other"
+
+    def _figure(self, prompt: str, label: str) -> str:
+        match = re.search(self._MONEY_FIELD.format(label), prompt)
+        return f"${match.group(1)}" if match else "$0.00"
+
+    def _insights(self, prompt: str) -> Dict:
+        top = self._TOP_CATEGORY.search(prompt)
+        change = self._EXPENSE_CHANGE.search(prompt)
+        anomalies = self._ANOMALIES.search(prompt)
+        expenses = self._figure(prompt, "Total Expenses")
+        net = self._figure(prompt, "Net")
+        
+        top_line = (
+            f"{top.group(1)} led spending at ${top.group(2)} ({top.group(3)} of expenses)."
+            if top else "No category stood out this period."
+        )
+        return {
+            "data": {
+                "summary": f"You spent {expenses} this period with a net of {net}.",
+                "insights": [
+                    top_line,
+                    f"Expenses {change.group(2)} by {change.group(1)} month over month." if change else "Expenses were stable month over month.",
+                    f"{anomalies.group(1) if anomalies else 0} unusual transactions were detected.",
+                ],
+                "recommendations": [
+                    f"Set a monthly limit for {top.group(1) if top else 'your largest category'}.",
+                    "Review recurring subscriptions and cancel unused ones.",
+                    "Automate a transfer to savings on payday.",
+                ],
+            }
+        }
+
+    def _maybe_fail(self):
+        with self._random_lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise google_exceptions.ServiceUnavailable("Offline backend simulated failure")
+
+    def _answer(self, prompt: str) -> str:
+        if '"categories"' in prompt:
+            items = [json.loads(line) for line in self._BATCH_ITEM.findall(prompt)]
+            return json.dumps({
+                "categories": {str(item["id"]): self._categorize(item["description"]) for item in items}
+            })
+        
+        if '"recommendations"' in prompt:
+            return json.dumps(self._insights(prompt))
+        
+        description = self._SINGLE_DESCRIPTION.search(prompt)
+        return self._categorize(description.group(1)) if description else "Other"
+
+    def generate(self, prompt: str, timeout: float):
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+            if self.latency > timeout:
+                raise google_exceptions.DeadlineExceeded("Offline backend exceeded the deadline")
+        
+        self._maybe_fail()
+        return LLMResponse(self._answer(prompt))
+
+    def generate_stream(self, prompt: str, timeout: float) -> Iterator[str]:
+        self._maybe_fail()
+        text = self._answer(prompt)
+        pieces = [text[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(text), self.STREAM_CHUNK_CHARS)]
+        
+        for piece in pieces:
+            if self.latency:
+                time.sleep(min(self.latency / len(pieces), timeout))
+            yield piece
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """
+    Build the LLM backend selected in settings.
+    
+    Args:
+        name: Backend name ('gemini' or 'offline'); defaults to LLM_BACKEND
+    
+    Returns:
+        The backend instance
+    """
+    name = (name or settings.llm_backend).lower()
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "offline":
+        return OfflineBackend(settings.llm_offline_latency_ms, settings.llm_offline_error_rate, settings.llm_offline_seed)
+    raise ValueError(f"Unknown LLM backend: {name}")
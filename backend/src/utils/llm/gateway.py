@@ -0,0 +1,243 @@
+import asyncio
+import random
+import threading
+import time
+from typing import AsyncIterator, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from src.config import settings
+from src.utils.llm.backends import LLMBackend, create_backend
+from src.utils.logging import *
+
+# Provider errors worth retrying; anything else fails the call straight away
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+)
+
+
+class LLMUnavailable(Exception):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Stops calling a degraded provider.
+    
+    After `failure_threshold` consecutive failed calls the circuit opens and
+    callers are rejected for `reset_seconds`. After that one call per reset
+    window is let through as a probe: success closes the circuit, failure
+    keeps it open.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return whether a call may go to the provider."""
+        state = self.state
+        if state == "half_open":
+            # Re-arm the window so only this caller probes the provider
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        if self.opened_at is not None:
+            log_info("LLM circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            log_warning("LLM circuit breaker opened", {"failures": self.failures})
+            self.opened_at = time.monotonic()
+
+
+# Shared by every LLM caller in the process
+_slots = asyncio.Semaphore(max(1, settings.llm_max_concurrency))
+_bucket = TokenBucket(settings.llm_requests_per_minute / 60, settings.llm_burst)
+_breaker = CircuitBreaker(settings.llm_circuit_failure_threshold, settings.llm_circuit_reset_seconds)
+_backend: Optional[LLMBackend] = None
+
+
+def _get_backend() -> LLMBackend:
+    """Build the configured backend once per process."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+        log_info("LLM backend ready", {"backend": _backend.name})
+    return _backend
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt."""
+    return random.uniform(0, settings.llm_retry_base_seconds * 2 ** attempt)
+
+
+async def _call(prompt: str):
+    """Run one backend request in a worker thread with a deadline."""
+    timeout = settings.llm_timeout_seconds
+    return await asyncio.wait_for(
+        asyncio.to_thread(_get_backend().generate, prompt, timeout),
+        timeout=timeout,
+    )
+
+
+async def generate(prompt: str):
+    """
+    Run an LLM request through the shared gateway.
+    
+    Requests wait for a free concurrency slot and a rate-limit token, run in
+    a worker thread with a per-call deadline, and retry transient errors with
+    jittered exponential backoff. While the provider is degraded the circuit
+    breaker rejects calls immediately so callers can use their fallback.
+    Only transient errors count towards opening it; other errors (e.g. a
+    rejected prompt) are raised without touching the breaker.
+    
+    Args:
+        prompt: Prompt text
+    
+    Returns:
+        The backend response; its `text` attribute holds the generated text
+    
+    Raises:
+        LLMUnavailable: If the circuit breaker is open
+    """
+    attempts = max(1, settings.llm_max_retries + 1)
+    async with _slots:
+        # Checked once a slot is free, so queued callers are turned away too
+        if not _breaker.allow():
+            raise LLMUnavailable("LLM circuit breaker is open")
+        
+        for attempt in range(attempts):
+            await _bucket.acquire()
+            try:
+                response = await _call(prompt)
+            except TRANSIENT_ERRORS as e:
+                if attempt + 1 >= attempts:
+                    _breaker.record_failure()
+                    raise
+                delay = _backoff(attempt)
+                log_warning("Transient LLM error, retrying", {"attempt": attempt + 1, "delay": round(delay, 2), "error": type(e).__name__})
+                await asyncio.sleep(delay)
+            else:
+                _breaker.record_success()
+                return response
+
+
+
+async def generate_stream(prompt: str) -> AsyncIterator[str]:
+    """
+    Stream an LLM response through the shared gateway.
+    
+    Uses the same concurrency slots, rate limit and circuit breaker as
+    generate. The backend's blocking stream is drained in a worker thread
+    and each piece must arrive within the per-call deadline. A slot is held
+    only while waiting for the next piece, never while the caller holds a
+    yielded one, so a client that stops reading cannot pin it. Closing the
+    generator stops the worker thread. Transient errors are retried only
+    before the first piece has been yielded.
+    
+    Args:
+        prompt: Prompt text
+    
+    Yields:
+        Pieces of the generated text, in order
+    
+    Raises:
+        LLMUnavailable: If the circuit breaker is open
+    """
+    loop = asyncio.get_running_loop()
+    finished = object()
+    attempts = max(1, settings.llm_max_retries + 1)
+    
+    async with _slots:
+        if not _breaker.allow():
+            raise LLMUnavailable("LLM circuit breaker is open")
+    
+    for attempt in range(attempts):
+        await _bucket.acquire()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for piece in _get_backend().generate_stream(prompt, settings.llm_timeout_seconds):
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+        
+        loop.run_in_executor(None, produce)
+        yielded = False
+        try:
+            while True:
+                async with _slots:
+                    item = await asyncio.wait_for(queue.get(), timeout=settings.llm_timeout_seconds)
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yielded = True
+                yield item
+        except TRANSIENT_ERRORS as e:
+            if yielded or attempt + 1 >= attempts:
+                _breaker.record_failure()
+                raise
+            delay = _backoff(attempt)
+            log_warning("Transient LLM error, retrying stream", {"attempt": attempt + 1, "delay": round(delay, 2), "error": type(e).__name__})
+            await asyncio.sleep(delay)
+        else:
+            _breaker.record_success()
+            return
+        finally:
+            stop.set()
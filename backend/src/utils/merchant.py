@@ -0,0 +1,58 @@
+import re
+
+# Payment processor and card network prefixes, e.g. "SQ *", "TST* ", "POS DEBIT"
+_PREFIXES = re.compile(
+    r"^(?:(?:pos|debit|purchase|recurring|checkcard|check card|visa|mastercard|"
+    r"ach|pmnt|payment to|paypal|pp|sq|tst|sp|dd)\b\s*\*?\s*)+"
+)
+# Fixed-width bank descriptors pad the merchant name before the location
+_FIELD_BREAK = re.compile(r"\s{2,}|\s+-\s+")
+_TOKEN_WITH_DIGIT = re.compile(r"\S*\d\S*")
+_WEB_SUFFIX = re.compile(r"^www\.|\.(?:com|net|org|co|io)\b(?:/\S*)?")
+_NON_WORD = re.compile(r"[^a-z&' ]+")
+_WHITESPACE = re.compile(r"\s+")
+
+_LEGAL_SUFFIXES = {"inc", "llc", "ltd", "co", "corp", "plc", "gmbh"}
+_US_STATES = {
+    "al", "ak", "az", "ar", "ca", "co", "ct", "de", "fl", "ga", "hi", "id", "il", "in", "ia",
+    "ks", "ky", "la", "me", "md", "ma", "mi", "mn", "ms", "mo", "mt", "ne", "nv", "nh", "nj",
+    "nm", "ny", "nc", "nd", "oh", "ok", "or", "pa", "ri", "sc", "sd", "tn", "tx", "ut", "vt",
+    "va", "wa", "wv", "wi", "wy", "dc",
+}
+
+# Longer keys are almost always a location or reference the rules above missed
+MAX_MERCHANT_TOKENS = 4
+
+
+def canonicalize_merchant(description: str) -> str:
+    """
+    Reduce a raw transaction description to a stable merchant key.
+    
+    Strips processor prefixes, the padded location field, tokens containing
+    digits (card suffixes, store numbers, transaction ids), web suffixes,
+    punctuation, trailing state codes and legal suffixes, so
+    "SQ *BLUE BOTTLE COFFEE #12  OAKLAND CA" and "Blue Bottle Coffee" share
+    the key "blue bottle coffee".
+    
+    Args:
+        description: Raw transaction description
+    
+    Returns:
+        Lowercase merchant key, or an empty string if nothing is left
+    """
+    text = str(description).lower().strip()
+    
+    fields = [field for field in _FIELD_BREAK.split(text) if _NON_WORD.sub("", field).strip()]
+    if fields:
+        text = fields[0]
+    
+    text = _PREFIXES.sub("", text.replace("*", " * ").strip())
+    text = _TOKEN_WITH_DIGIT.sub(" ", text)
+    text = _WEB_SUFFIX.sub(" ", text)
+    text = _NON_WORD.sub(" ", text)
+    tokens = _WHITESPACE.sub(" ", text).strip().split()
+    
+    while len(tokens) > 1 and (tokens[-1] in _US_STATES or tokens[-1] in _LEGAL_SUFFIXES):
+        tokens.pop()
+    
+    return " ".join(tokens[:MAX_MERCHANT_TOKENS])
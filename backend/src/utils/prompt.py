@@ -1,3 +1,4 @@
+import json
 from typing import Dict, List, Any
 
 NumberLike = Any
@@ -24,6 +25,10 @@ CATEGORIES = [
 ]
 
 
+# Bump whenever insights_prompt changes so cached insights are regenerated
+INSIGHTS_PROMPT_VERSION = "1"
+
+
 def insights_prompt(data_context: str) -> str:
     """
     Build a prompt for generating financial insights.
@@ -83,6 +88,32 @@ def insights_prompt(data_context: str) -> str:
     return prompt
 
 
+# Keyword -> category rules; shown to the LLM as examples and compiled into
+# the local keyword matcher that categorizes obvious transactions without it
+CATEGORY_KEYWORDS = {
+    "Transport": ["uber", "lyft", "metro", "bus", "gas"],
+    "Groceries": ["grocery", "supermarket", "whole foods", "trader joe", "walmart"],
+    "Subscriptions": ["netflix", "spotify", "apple music", "hulu", "prime"],
+    "Bills & Utilities": ["rent", "electric", "water", "internet", "phone"],
+    "Income": ["salary", "payroll", "direct deposit", "refund"],
+    "Healthcare": ["doctor", "pharmacy", "clinic"],
+}
+
+_KEYWORD_MAPPINGS = "\n".join(
+    "          • " + ", ".join(f'"{keyword}"' for keyword in keywords) + f" -> {category}"
+    for category, keywords in CATEGORY_KEYWORDS.items()
+)
+
+CATEGORIZATION_GUIDELINES = f"""
+        Guidelines:
+        - Use the provided categories only; if none clearly fits, return "Other".
+        - Common mappings (not exhaustive):
+{_KEYWORD_MAPPINGS}
+        - Ignore merchant suffixes like city/state or transaction ids.
+        - Do not infer beyond the description; amount can be a tie-breaker (very small recurring amounts may indicate Subscriptions; very large recurring amounts may indicate Bills & Utilities or Rent).
+"""
+
+
 def categorization_prompt(description: str, amount: float) -> str:
     """
     Build a prompt for categorizing a transaction.
@@ -101,20 +132,52 @@ def categorization_prompt(description: str, amount: float) -> str:
 
         Transaction description: {description}
         Amount: ${amount:,.2f}
+        {CATEGORIZATION_GUIDELINES}
+        Respond with ONLY the category name from the list above. No punctuation, quotes, or extra words.
+    """
+    return prompt
 
-        Guidelines:
-        - Use the provided categories only; if none clearly fits, return "Other".
-        - Common mappings (not exhaustive):
-          • "uber", "lyft", "metro", "bus", "gas" -> Transport
-          • "grocery", "supermarket", "whole foods", "trader joe", "walmart" -> Groceries
-          • "netflix", "spotify", "apple music", "hulu", "prime" -> Subscriptions
-          • "rent", "electric", "water", "internet", "phone" -> Bills & Utilities
-          • "salary", "payroll", "direct deposit", "refund" -> Income
-          • "doctor", "pharmacy", "clinic" -> Healthcare
-        - Ignore merchant suffixes like city/state or transaction ids.
-        - Do not infer beyond the description; amount can be a tie-breaker (very small recurring amounts may indicate Subscriptions; very large recurring amounts may indicate Bills & Utilities or Rent).
 
-        Respond with ONLY the category name from the list above. No punctuation, quotes, or extra words.
+def batch_categorization_item(item_id: str, description: str, amount: float) -> str:
+    """
+    Format one transaction as a line of a batch categorization prompt.
+    
+    Args:
+        item_id: Identifier echoed back in the response
+        description: Transaction description
+        amount: Transaction amount
+        
+    Returns:
+        JSON line describing the transaction
+    """
+    return json.dumps({"id": item_id, "description": description, "amount": round(float(amount), 2)})
+
+
+def batch_categorization_prompt(item_lines: List[str]) -> str:
+    """
+    Build a prompt for categorizing many transactions in one request.
+    
+    Args:
+        item_lines: Transactions formatted with batch_categorization_item
+        
+    Returns:
+        Formatted prompt string
+    """
+
+    prompt = f"""
+        Categorize each transaction below into EXACTLY ONE of these categories:
+        {', '.join(CATEGORIES)}
+
+        Transactions (one JSON object per line):
+        {chr(10).join(item_lines)}
+        {CATEGORIZATION_GUIDELINES}
+        Output VALID JSON only. No markdown, code fences, or extra text before/after the JSON.
+        Map every transaction id to its category name, using this EXACT structure:
+            {{
+                "categories": {{
+                    "<id>": "<category>"
+                }}
+            }}
     """
     return prompt
 
@@ -71,6 +71,7 @@ class Insight(BaseModel):
 class InsightGenerate(BaseModel):
     period: Literal["week", "month", "quarter", "year", "total"] = "month"
     focus: Optional[str] = None  # e.g., "savings", "spending", "subscriptions"
+    force_refresh: bool = False  # Bypass the insights cache
 
 
 # ============= CSV Upload Models =============
@@ -79,9 +80,50 @@ class CSVUploadResponse(BaseModel):
     total_rows: int
     successful_imports: int
     failed_imports: int
+    duplicate_rows: int = 0
     errors: List[str] = []
 
 
+class StagedTransaction(BaseModel):
+    row_number: int
+    date: date
+    description: str
+    amount: float
+    type: Literal["income", "expense"]
+
+
+class UploadPreview(BaseModel):
+    message: str
+    stage_id: Optional[str] = None
+    filename: str
+    total_rows: int
+    valid_rows: int
+    failed_rows: int
+    errors: List[str] = []
+    expires_at: Optional[datetime] = None
+    offset: int = 0
+    rows: List[StagedTransaction] = []
+
+
+class ImportProgress(BaseModel):
+    rows_parsed: int = 0
+    rows_categorized: int = 0
+    rows_inserted: int = 0
+    rows_failed: int = 0
+    rows_duplicate: int = 0
+
+
+class ImportJobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed", "cancelled"]
+    filename: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: ImportProgress = Field(default_factory=ImportProgress)
+    result: Optional[CSVUploadResponse] = None
+
+
 # ============= Category Models =============
 class CategorySpending(BaseModel):
     category: str
@@ -98,6 +140,11 @@ class SpendingSummary(BaseModel):
     period: str
 
 
+class CategoryRuleCreate(BaseModel):
+    keyword: str = Field(..., min_length=2)
+    category: str
+
+
 # ============= Forecast Models =============
 class ForecastItem(BaseModel):
     month: str
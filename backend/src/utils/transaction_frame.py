@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Day numbers count from the Unix epoch, like numpy's datetime64[D]
+EPOCH = date(1970, 1, 1)
+
+# Type codes; anything other than income or expense is OTHER
+INCOME = 0
+EXPENSE = 1
+OTHER = -1
+TYPE_CODES = {"income": INCOME, "expense": EXPENSE}
+TYPE_NAMES = {INCOME: "income", EXPENSE: "expense"}
+
+
+def day_number(value: date) -> int:
+    """Days between the epoch and `value`."""
+    return (value - EPOCH).days
+
+
+def month_number(value: date) -> int:
+    """Months between the epoch and the month containing `value`."""
+    return (value.year - EPOCH.year) * 12 + value.month - 1
+
+
+class TransactionFrame:
+    """
+    Columnar, date-sorted view of transactions for analytics.
+    
+    Dates are int32 day numbers, amounts float64, types int8 codes and
+    categories int32 codes into `categories`, so aggregations are NumPy
+    reductions and date windows are binary searches that return views.
+    Ids and descriptions are only kept to report individual rows. Frames
+    built from monthly rollups carry `counts`, the number of transactions
+    each row stands for; otherwise every row counts once.
+    """
+    
+    __slots__ = ("days", "amounts", "types", "category_codes", "categories", "ids", "descriptions", "counts")
+
+    def __init__(
+        self,
+        days: np.ndarray,
+        amounts: np.ndarray,
+        types: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[Optional[str]],
+        ids: Optional[np.ndarray] = None,
+        descriptions: Optional[np.ndarray] = None,
+        counts: Optional[np.ndarray] = None
+    ):
+        self.days = days
+        self.amounts = amounts
+        self.types = types
+        self.category_codes = category_codes
+        self.categories = categories
+        self.ids = ids
+        self.descriptions = descriptions
+        self.counts = counts
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], date_key: str = "date", amount_key: str = "amount", count_key: Optional[str] = None) -> "TransactionFrame":
+        """
+        Build a frame from rows as returned by PostgREST.
+        
+        Args:
+            rows: Rows with date, amount, category and type; id and
+                description are kept when present
+            date_key: Column holding the ISO date
+            amount_key: Column holding the amount
+            count_key: Column holding a transaction count, for rollup rows
+        
+        Returns:
+            The frame, sorted by date
+        """
+        n = len(rows)
+        index: Dict[Optional[str], int] = {}
+        
+        frame = cls(
+            days=np.array([str(row[date_key])[:10] for row in rows], dtype="datetime64[D]").astype(np.int32),
+            amounts=np.fromiter((float(row[amount_key]) for row in rows), dtype=np.float64, count=n),
+            types=np.fromiter((TYPE_CODES.get(row.get("type"), OTHER) for row in rows), dtype=np.int8, count=n),
+            # Categories are interned in order of first appearance
+            category_codes=np.fromiter((index.setdefault(row.get("category"), len(index)) for row in rows), dtype=np.int32, count=n),
+            categories=[],
+            ids=np.array([row["id"] for row in rows], dtype=object) if n and "id" in rows[0] else None,
+            descriptions=np.array([row["description"] for row in rows], dtype=object) if n and "description" in rows[0] else None,
+            counts=np.fromiter((int(row[count_key]) for row in rows), dtype=np.int32, count=n) if count_key else None
+        )
+        frame.categories = list(index)
+        
+        if n > 1 and np.any(frame.days[1:] < frame.days[:-1]):
+            frame = frame.take(np.argsort(frame.days, kind="stable"))
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def take(self, selector) -> "TransactionFrame":
+        """Select rows with a slice, boolean mask or index array."""
+        return TransactionFrame(
+            self.days[selector],
+            self.amounts[selector],
+            self.types[selector],
+            self.category_codes[selector],
+            self.categories,
+            self.ids[selector] if self.ids is not None else None,
+            self.descriptions[selector] if self.descriptions is not None else None,
+            self.counts[selector] if self.counts is not None else None
+        )
+
+    def between(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> "TransactionFrame":
+        """Rows dated within [start_date, end_date]; either bound may be open."""
+        lo = np.searchsorted(self.days, day_number(start_date), side="left") if start_date else 0
+        hi = np.searchsorted(self.days, day_number(end_date), side="right") if end_date else len(self)
+        return self.take(slice(lo, hi))
+
+    def of_type(self, code: int) -> "TransactionFrame":
+        return self.take(self.types == code)
+
+    def row_counts(self) -> np.ndarray:
+        """Transactions represented by each row."""
+        return self.counts if self.counts is not None else np.ones(len(self), dtype=np.int32)
+
+    def months(self) -> np.ndarray:
+        """Month number of each row, as month_number would compute it."""
+        return self.days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+
+    def total(self, code: int) -> float:
+        """Sum of amounts of one transaction type."""
+        return float(self.amounts[self.types == code].sum())
+
+    def category_sums(self) -> np.ndarray:
+        """Amount totals per category code."""
+        return np.bincount(self.category_codes, weights=self.amounts, minlength=len(self.categories))
+
+    def category_counts(self) -> np.ndarray:
+        """Transaction counts per category code."""
+        return np.bincount(self.category_codes, weights=self.counts, minlength=len(self.categories)).astype(np.int64)
+
+    def date_at(self, position: int) -> date:
+        return EPOCH + timedelta(days=int(self.days[position]))
+
+    @property
+    def first_date(self) -> Optional[date]:
+        return self.date_at(0) if len(self) else None
+
+    @property
+    def last_date(self) -> Optional[date]:
+        return self.date_at(-1) if len(self) else None
+
+    def row(self, position: int) -> Dict:
+        """One row as a transaction dictionary."""
+        row = {"id": self.ids[position]} if self.ids is not None else {}
+        row["date"] = self.date_at(position).isoformat()
+        if self.descriptions is not None:
+            row["description"] = self.descriptions[position]
+        row["amount"] = float(self.amounts[position])
+        row["category"] = self.categories[self.category_codes[position]]
+        row["type"] = TYPE_NAMES.get(int(self.types[position]))
+        return row
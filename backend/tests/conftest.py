@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+# Settings and the Supabase client are created at import time; tests patch
+# get_supabase_admin and never reach these services
+PLACEHOLDER_JWT = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test"
+
+for name, value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": PLACEHOLDER_JWT,
+    "SUPABASE_SERVICE_KEY": PLACEHOLDER_JWT,
+    "GOOGLE_CLIENT_ID": "test",
+    "GOOGLE_CLIENT_SECRET": "test",
+    "GOOGLE_REDIRECT_URI": "http://localhost:3000/auth/callback",
+    "GEMINI_API_KEY": "test",
+    "GEMINI_MODEL": "test",
+    "CORS_ORIGINS": "",
+    "APP_HOST": "127.0.0.1",
+    "APP_PORT": "8000",
+    "MAX_UPLOAD_SIZE_MB": "10",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import date, timedelta
+
+from src.services import analytics
+from src.utils.transaction_frame import TransactionFrame
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return _Query([row for row in self.rows if row[column] == value])
+
+    def in_(self, column, values):
+        return _Query([row for row in self.rows if row[column] in values])
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class _Supabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return _Query(self.rows)
+
+
+def _transactions():
+    today = date.today()
+    amounts = [40.0 + i for i in range(12)] + [400.0]
+    return [
+        {
+            "id": f"t{i}",
+            "user_id": "user-1",
+            "date": (today - timedelta(days=i)).isoformat(),
+            "description": f"Corner Market {i}",
+            "merchant": "corner market",
+            "amount": amount,
+            "category": "Groceries",
+            "type": "expense",
+            "source": "manual",
+            "fingerprint": None,
+            "created_at": f"{today.isoformat()}T00:00:00+00:00",
+        }
+        for i, amount in enumerate(amounts)
+    ]
+
+
+def test_anomalies_return_complete_transaction_rows(monkeypatch):
+    rows = _transactions()
+    monkeypatch.setattr(analytics, "get_supabase_admin", lambda: _Supabase(rows))
+    columns = [column.strip() for column in analytics.SNAPSHOT_COLUMNS.split(",")]
+    frame = TransactionFrame.from_rows([{column: row[column] for column in columns} for row in rows])
+
+    anomalies = asyncio.run(analytics.detect_anomalies("user-1", frame=frame))
+
+    assert len(anomalies) == 1
+    assert set(anomalies[0]) == {"transaction", "z_score", "category_average", "reason"}
+    assert anomalies[0]["transaction"] == rows[-1]
+    assert anomalies[0]["reason"] == "Unusually high Groceries expense"
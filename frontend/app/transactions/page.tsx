@@ -4,6 +4,7 @@ import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
 import { useAuth } from '@/contexts/AuthContext';
 import { api } from '@/lib/api';
+import { CATEGORIES } from '@/lib/categories';
 import AppLayout from '@/components/AppLayout';
 import Loading from '@/components/Loading';
 
@@ -18,12 +19,26 @@ interface Transaction {
   created_at: string;
 }
 
+interface TransactionPage {
+  transactions: Transaction[];
+  next_cursor: string | null;
+}
+
+interface SpendingSummary {
+  total_income: number;
+  total_expense: number;
+  categories: { category: string; total: number; count: number }[];
+}
+
 export default function TransactionsPage() {
   const { user, loading: authLoading } = useAuth();
   const router = useRouter();
   
   const [transactions, setTransactions] = useState<Transaction[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [summary, setSummary] = useState<SpendingSummary | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   
   // Filters
@@ -71,21 +86,41 @@ export default function TransactionsPage() {
     if (user) {
       fetchTransactions();
     }
-  }, [user, startDate, endDate, categoryFilter, typeFilter]);
+  }, [user, startDate, endDate, categoryFilter, typeFilter, sortField, sortDirection]);
+
+  useEffect(() => {
+    if (user) {
+      fetchSummary();
+    }
+  }, [user, startDate, endDate]);
+
+  const filterParams = () => {
+    const params: any = { sort: sortField, order: sortDirection };
+    if (startDate) params.start_date = startDate;
+    if (endDate) params.end_date = endDate;
+    if (categoryFilter) params.category = categoryFilter;
+    if (typeFilter) params.type = typeFilter;
+    return params;
+  };
+
+  // Totals cover every transaction in the date range, not just the loaded pages
+  const fetchSummary = async () => {
+    try {
+      const data = await api.getSummary(startDate || undefined, endDate || undefined) as SpendingSummary;
+      setSummary(data);
+    } catch (err: any) {
+      setSummary(null);
+    }
+  };
 
   const fetchTransactions = async () => {
     try {
       setLoading(true);
       setError(null);
       
-      const params: any = {};
-      if (startDate) params.start_date = startDate;
-      if (endDate) params.end_date = endDate;
-      if (categoryFilter) params.category = categoryFilter;
-      if (typeFilter) params.type = typeFilter;
-      
-      const data = await api.getTransactions(params) as Transaction[];
-      setTransactions(data);
+      const data = await api.getTransactions(filterParams()) as TransactionPage;
+      setTransactions(data.transactions);
+      setNextCursor(data.next_cursor);
     } catch (err: any) {
       setError(err.message || 'Failed to load transactions');
     } finally {
@@ -93,6 +128,20 @@ export default function TransactionsPage() {
     }
   };
 
+  const loadMoreTransactions = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const data = await api.getTransactions({ ...filterParams(), cursor: nextCursor }) as TransactionPage;
+      setTransactions([...transactions, ...data.transactions]);
+      setNextCursor(data.next_cursor);
+    } catch (err: any) {
+      setError(err.message || 'Failed to load transactions');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSort = (field: 'date' | 'amount' | 'category') => {
     if (sortField === field) {
       setSortDirection(sortDirection === 'asc' ? 'desc' : 'asc');
@@ -102,25 +151,6 @@ export default function TransactionsPage() {
     }
   };
 
-  const sortedTransactions = [...transactions].sort((a, b) => {
-    let aVal: any = a[sortField];
-    let bVal: any = b[sortField];
-    
-    if (sortField === 'date') {
-      aVal = new Date(aVal).getTime();
-      bVal = new Date(bVal).getTime();
-    } else if (sortField === 'amount') {
-      aVal = parseFloat(aVal);
-      bVal = parseFloat(bVal);
-    }
-    
-    if (sortDirection === 'asc') {
-      return aVal > bVal ? 1 : -1;
-    } else {
-      return aVal < bVal ? 1 : -1;
-    }
-  });
-
   const handleEdit = (transaction: Transaction) => {
     setEditingTransaction(transaction);
     setEditForm({
@@ -146,6 +176,7 @@ export default function TransactionsPage() {
       
       setEditingTransaction(null);
       fetchTransactions();
+      fetchSummary();
     } catch (err: any) {
       alert(`Failed to update transaction: ${err.message}`);
     }
@@ -155,6 +186,7 @@ export default function TransactionsPage() {
     try {
       await api.deleteTransaction(id);
       fetchTransactions();
+      fetchSummary();
       setDeletingId(null);
     } catch (err: any) {
       alert(`Failed to delete transaction: ${err.message}`);
@@ -223,20 +255,16 @@ export default function TransactionsPage() {
       
       // Refresh transactions
       fetchTransactions();
+      fetchSummary();
     } catch (err: any) {
       alert(`Failed to create transaction: ${err.message}`);
     }
   };
 
-  const uniqueCategories = Array.from(new Set(transactions.map(t => t.category))).sort();
-
-  const totalIncome = transactions
-    .filter(t => t.type === 'income')
-    .reduce((sum, t) => sum + t.amount, 0);
-  
-  const totalExpense = transactions
-    .filter(t => t.type === 'expense')
-    .reduce((sum, t) => sum + t.amount, 0);
+  // The summary breaks expenses down by category; income is not
+  const categoryExpense = summary?.categories.find(c => c.category === categoryFilter);
+  const totalIncome = summary?.total_income ?? 0;
+  const totalExpense = categoryFilter ? categoryExpense?.total ?? 0 : summary?.total_expense ?? 0;
 
   if (authLoading || loading) {
     return <Loading message="Loading transactions..." />;
@@ -263,16 +291,19 @@ export default function TransactionsPage() {
       {/* Summary Cards */}
         <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-8">
           <div className="bg-white rounded-lg shadow p-4">
-            <p className="text-sm text-gray-600">Total Transactions</p>
-            <p className="text-2xl font-bold text-gray-800">{transactions.length}</p>
+            <p className="text-sm text-gray-600">Loaded Transactions</p>
+            <p className="text-2xl font-bold text-gray-800">{transactions.length}{nextCursor ? '+' : ''}</p>
+            <p className="text-xs text-gray-500">{nextCursor ? 'More available below' : 'All matching transactions'}</p>
           </div>
           <div className="bg-white rounded-lg shadow p-4">
             <p className="text-sm text-gray-600">Total Income</p>
             <p className="text-2xl font-bold text-green-600">${totalIncome.toFixed(2)}</p>
+            <p className="text-xs text-gray-500">Selected dates, all categories</p>
           </div>
           <div className="bg-white rounded-lg shadow p-4">
             <p className="text-sm text-gray-600">Total Expenses</p>
             <p className="text-2xl font-bold text-red-600">${totalExpense.toFixed(2)}</p>
+            <p className="text-xs text-gray-500">Selected dates, {categoryFilter || 'all categories'}</p>
           </div>
         </div>
 
@@ -314,7 +345,7 @@ export default function TransactionsPage() {
                 className="w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-[#93BFC7] focus:border-transparent text-gray-900 placeholder:text-gray-400"
               >
                 <option value="">All Categories</option>
-                {uniqueCategories.map(cat => (
+                {CATEGORIES.map(cat => (
                   <option key={cat} value={cat}>{cat}</option>
                 ))}
               </select>
@@ -392,14 +423,14 @@ export default function TransactionsPage() {
                 </tr>
               </thead>
               <tbody className="bg-white divide-y divide-gray-200">
-                {sortedTransactions.length === 0 ? (
+                {transactions.length === 0 ? (
                   <tr>
                     <td colSpan={7} className="px-6 py-8 text-center text-gray-500">
                       No transactions found. Try adjusting your filters or upload some data.
                     </td>
                   </tr>
                 ) : (
-                  sortedTransactions.map((transaction) => (
+                  transactions.map((transaction) => (
                     <tr key={transaction.id} className="hover:bg-gray-50">
                       <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
                         {new Date(transaction.date).toLocaleDateString()}
@@ -447,6 +478,17 @@ export default function TransactionsPage() {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center border-t">
+              <button
+                onClick={loadMoreTransactions}
+                disabled={loadingMore}
+                className="px-4 py-2 bg-[#93BFC7] text-white rounded-md hover:bg-[#7AABB5] transition disabled:bg-gray-300 disabled:cursor-not-allowed"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
 
       {/* Edit Modal */}
@@ -0,0 +1,21 @@
+// Categories the backend assigns (src/utils/prompt.py CATEGORIES), plus the
+// placeholder used before a transaction is categorized
+export const CATEGORIES = [
+  'Food & Dining',
+  'Transport',
+  'Entertainment',
+  'Shopping',
+  'Bills & Utilities',
+  'Healthcare',
+  'Education',
+  'Subscriptions',
+  'Groceries',
+  'Travel',
+  'Personal Care',
+  'Home & Garden',
+  'Insurance',
+  'Investments',
+  'Income',
+  'Other',
+  'Uncategorized',
+];